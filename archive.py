@@ -0,0 +1,101 @@
+import glob
+import gzip
+import json
+import os
+import zlib
+from datetime import datetime, timedelta
+from typing import Dict, Iterator, List, Tuple
+
+from scrapers.listing import Listing, to_json_value
+
+ARCHIVE_DIR = os.environ.get('ARCHIVE_DIR', 'archive')
+# Inactive listings stay in the working set this many days after removal, so they can still be reactivated
+RETENTION_DAYS = int(os.environ.get('RETENTION_DAYS', 30))
+UNDATED_PARTITION = 'undated'
+
+
+def removal_date(listing: Dict) -> str:
+    """YYYY-MM-DD the listing was removed, or '' if unknown"""
+    return listing.get('removed_at') or (listing.get('last_updated') or '')[:10]
+
+
+class ListingArchive:
+    """
+    Inactive listings moved out of the working set, in gzip-compressed JSON lines
+    partitioned by month of removal (archive/listings-2026-10.jsonl.gz). Each
+    archiving appends a gzip member, so existing partitions are never rewritten.
+    """
+
+    def __init__(self, directory: str = ARCHIVE_DIR):
+        self.directory = directory
+
+    def partition_path(self, partition: str) -> str:
+        return os.path.join(self.directory, f"listings-{partition}.jsonl.gz")
+
+    def append(self, listings: List[Dict]) -> int:
+        by_partition = {}
+        for listing in listings:
+            partition = removal_date(listing)[:7] or UNDATED_PARTITION
+            by_partition.setdefault(partition, []).append(listing)
+
+        os.makedirs(self.directory, exist_ok=True)
+        for partition, partition_listings in sorted(by_partition.items()):
+            data = ''.join(json.dumps(listing, ensure_ascii=False, default=to_json_value) + '\n'
+                           for listing in partition_listings)
+            with gzip.open(self.partition_path(partition), 'at', encoding='utf-8') as f:
+                f.write(data)
+        return len(listings)
+
+    def partitions(self, since: str = None, until: str = None) -> List[str]:
+        """Partition files overlapping the since/until dates (YYYY-MM-DD or YYYY-MM)"""
+        paths = []
+        for path in sorted(glob.glob(self.partition_path('*'))):
+            partition = os.path.basename(path)[len('listings-'):-len('.jsonl.gz')]
+            if partition != UNDATED_PARTITION:
+                if since and partition < since[:7]:
+                    continue
+                if until and partition > until[:7]:
+                    continue
+            paths.append(path)
+        return paths
+
+    def read(self, path: str) -> Iterator[Listing]:
+        try:
+            with gzip.open(path, 'rt', encoding='utf-8') as f:
+                for line in f:
+                    yield Listing.from_dict(json.loads(line))
+        except (EOFError, OSError, zlib.error, ValueError) as e:
+            # A crash mid-append can leave a truncated last member
+            print(f"Stopped reading {path} at a damaged entry: {e}")
+
+    def query(self, text: str = None, source: str = None, since: str = None, until: str = None) -> Iterator[Listing]:
+        """
+        Archived listings removed between since and until, optionally from one source
+        and with text in the address or URL. Only the partitions in range are read.
+        """
+        text = text.lower() if text else None
+        for path in self.partitions(since, until):
+            for listing in self.read(path):
+                removed = removal_date(listing)
+                if since and removed and removed < since:
+                    continue
+                if until and removed and removed[:len(until)] > until:
+                    continue
+                if source and listing.get('source') != source:
+                    continue
+                if text and text not in f"{listing.get('address') or ''} {listing.get('url') or ''}".lower():
+                    continue
+                yield listing
+
+
+def split_retained(listings: List[Dict], days: int = RETENTION_DAYS, now: datetime = None) -> Tuple[List[Dict], List[Dict]]:
+    """Split listings into the working set and inactive listings removed more than days ago"""
+    cutoff = ((now or datetime.now()) - timedelta(days=days)).strftime('%Y-%m-%d')
+    kept = []
+    expired = []
+    for listing in listings:
+        if not listing.get('active', True) and removal_date(listing) < cutoff:
+            expired.append(listing)
+        else:
+            kept.append(listing)
+    return kept, expired
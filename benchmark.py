@@ -0,0 +1,205 @@
+"""
+End-to-end benchmark of the scrape, diff, notify and save pipeline, run offline
+against recorded HTTP fixtures and the fake Discord backend.
+
+    python benchmark.py --record           # capture the live Subo and Dios responses once
+    python benchmark.py                    # replay them and compare against the baseline
+    python benchmark.py --update-baseline  # store the current results as the new baseline
+
+Two scenarios are measured: 'cold' (no stored listings or HTTP cache, every
+listing is new) and 'warm' (a second run on the state the cold run left behind).
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from collections import Counter
+
+BASELINE_FILE = 'benchmark_baseline.json'
+FIXTURES_DIR = os.path.join('fixtures', 'http')
+# Allowed growth over the baseline before a result counts as a regression
+TIME_TOLERANCE = 0.25
+MEMORY_TOLERANCE = 0.25
+SCENARIOS = ('cold', 'warm')
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Offline end-to-end benchmark')
+    parser.add_argument('--record', action='store_true', help='Record fixtures from the live sites instead of benchmarking')
+    parser.add_argument('--update-baseline', action='store_true', help=f'Write the results to {BASELINE_FILE}')
+    parser.add_argument('--runs', type=int, default=5, help='Number of timed runs per scenario')
+    parser.add_argument('--latency', type=float, default=0.0, help='Seconds of artificial latency per replayed request')
+    parser.add_argument('--fixtures', default=FIXTURES_DIR, help='Fixture directory')
+    parser.add_argument('--baseline', default=BASELINE_FILE, help='Baseline file')
+    return parser.parse_args()
+
+
+def configure(args):
+    # Read by config.py and scrapers/fixtures.py at import, so set before importing main
+    os.environ['NOTIFIER_BACKEND'] = 'fake'
+    os.environ['HTTP_FIXTURES_MODE'] = 'record' if args.record else 'replay'
+    os.environ['HTTP_FIXTURES_DIR'] = args.fixtures
+    os.environ['HTTP_FIXTURES_LATENCY'] = str(args.latency)
+
+
+def run_pipeline(workdir):
+    """One full run with its state (HTTP cache, detail cache, database) kept in workdir"""
+    import main
+    from fake_discord import FakeNotifier
+    from scrapers.detail_cache import DetailCache
+    from scrapers.dios import DiosScraper
+    from scrapers.http_client import ResponseCache
+    from scrapers.metrics import metrics
+    from scrapers.subo import SuboScraper
+    from storage import SqliteListingStore
+
+    cache_dir = os.path.join(workdir, 'http_cache')
+    cache = ResponseCache(cache_dir)
+    subo, dios = SuboScraper(), DiosScraper()
+    for scraper in (subo, dios):
+        scraper.http.cache = cache
+    dios.detail_cache = DetailCache(os.path.join(cache_dir, 'details.json'))
+    notifier = FakeNotifier(log_path=None)
+    store = SqliteListingStore(os.path.join(workdir, 'listings.db'), json_path=os.path.join(workdir, 'listings.json'))
+
+    metrics.reset()
+    started = time.perf_counter()
+    try:
+        listings = store.load()
+        all_listings, new, removed, reactivated = asyncio.run(main.scrape_and_notify(
+            notifier, listings, [subo, dios], main.SCRAPER_CONCURRENCY, main.SCRAPER_TIMEOUT
+        ))
+        store.save(all_listings)
+        wall_time = time.perf_counter() - started
+    finally:
+        store.close()
+        subo.http.close()
+        dios.http.close()
+
+    scopes = metrics.report()['scopes'].values()
+    return {
+        'wall_time': wall_time,
+        'requests': sum(scope['counters'].get('requests', 0) for scope in scopes),
+        'bytes': sum(scope['counters'].get('bytes', 0) for scope in scopes),
+        'listings': len(all_listings),
+        'new': len(new),
+        'discord': dict(Counter(entry['action'] for entry in notifier.channel.log)),
+    }
+
+
+def run_scenarios(quiet=True):
+    """Run cold then warm in a fresh directory. Returns {scenario: result}."""
+    results = {}
+    with tempfile.TemporaryDirectory() as workdir:
+        for scenario in SCENARIOS:
+            output = io.StringIO() if quiet else sys.stdout
+            # The scrapers print progress; keep the benchmark output readable
+            with contextlib.redirect_stdout(output):
+                results[scenario] = run_pipeline(workdir)
+    return results
+
+
+def benchmark(runs):
+    timed = [run_scenarios() for _ in range(runs)]
+
+    # Separate pass for memory, since tracing allocations slows everything down
+    peaks = {}
+    tracemalloc.start()
+    with tempfile.TemporaryDirectory() as workdir:
+        for scenario in SCENARIOS:
+            tracemalloc.reset_peak()
+            with contextlib.redirect_stdout(io.StringIO()):
+                run_pipeline(workdir)
+            peaks[scenario] = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    results = {}
+    for scenario in SCENARIOS:
+        runs_for_scenario = [run[scenario] for run in timed]
+        wall_times = [result['wall_time'] for result in runs_for_scenario]
+        result = dict(runs_for_scenario[-1])
+        result['wall_time'] = round(statistics.median(wall_times), 4)
+        result['wall_time_runs'] = [round(t, 4) for t in wall_times]
+        result['peak_memory_kb'] = round(peaks[scenario] / 1024)
+        results[scenario] = result
+    return results
+
+
+def compare(results, baseline):
+    """Regressions of the results against the baseline, as printable strings"""
+    regressions = []
+    for scenario, result in results.items():
+        base = baseline.get('scenarios', {}).get(scenario)
+        if not base:
+            regressions.append(f"{scenario}: not in the baseline")
+            continue
+        if result['wall_time'] > base['wall_time'] * (1 + TIME_TOLERANCE):
+            regressions.append(f"{scenario}: wall time {result['wall_time']:.3f}s vs {base['wall_time']:.3f}s")
+        if result['peak_memory_kb'] > base['peak_memory_kb'] * (1 + MEMORY_TOLERANCE):
+            regressions.append(f"{scenario}: peak memory {result['peak_memory_kb']}KB vs {base['peak_memory_kb']}KB")
+        # Replayed runs are deterministic, so any extra request is a regression
+        if result['requests'] > base['requests']:
+            regressions.append(f"{scenario}: {result['requests']} requests vs {base['requests']}")
+    return regressions
+
+
+def print_results(results, baseline):
+    for scenario, result in results.items():
+        base = baseline.get('scenarios', {}).get(scenario, {})
+        vs = f" (baseline {base['wall_time']:.3f}s)" if base else ''
+        discord_calls = ', '.join(f"{action}={count}" for action, count in sorted(result['discord'].items()))
+        print(f"{scenario}: {result['wall_time']:.3f}s{vs}, {result['requests']} requests, "
+              f"{result['bytes'] / 1024:.0f}KB, peak memory {result['peak_memory_kb']}KB, "
+              f"{result['listings']} listings ({result['new']} new), discord: {discord_calls or 'none'}")
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    configure(args)
+
+    if args.record:
+        print(f"Recording live responses to {args.fixtures}")
+        result = run_scenarios(quiet=False)['cold']
+        print(f"Recorded {result['requests']} responses ({result['listings']} listings)")
+        sys.exit(0)
+
+    if not os.path.isdir(args.fixtures):
+        print(f"No fixtures in {args.fixtures}, run with --record first")
+        sys.exit(1)
+
+    try:
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+    except (OSError, json.JSONDecodeError) as e:
+        if not args.update_baseline:
+            # Without a baseline nothing would be compared and every run would pass
+            print(f"Can't read the baseline {args.baseline} ({e}), run with --update-baseline first")
+            sys.exit(1)
+        baseline = {}
+
+    results = benchmark(args.runs)
+    print_results(results, baseline)
+
+    if args.update_baseline:
+        with open(args.baseline, 'w', encoding='utf-8') as f:
+            json.dump({
+                'python': platform.python_version(),
+                'latency': args.latency,
+                'runs': args.runs,
+                'scenarios': results,
+            }, f, indent=2)
+        print(f"Baseline written to {args.baseline}")
+        sys.exit(0)
+
+    regressions = compare(results, baseline)
+    for regression in regressions:
+        print(f"Regression: {regression}")
+    sys.exit(1 if regressions else 0)
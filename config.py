@@ -1,25 +1,88 @@
 import os
 import sys
+from functools import lru_cache
 from pathlib import Path
 
-# Try environment variables first
-DISCORD_BOT_TOKEN = os.environ.get('DISCORD_BOT_TOKEN')
-DISCORD_CHANNEL_ID = os.environ.get('DISCORD_CHANNEL_ID')
+# Notification backend: 'gateway' (bot login), 'webhook' (channel webhook over plain HTTP)
+# or 'fake' (messages are only recorded, for offline runs and benchmarks)
+NOTIFIER_BACKEND = os.environ.get('NOTIFIER_BACKEND', 'gateway')
+# With the fake backend, where to write the recorded messages (optional)
+FAKE_DISCORD_LOG = os.environ.get('FAKE_DISCORD_LOG')
 
-# If not found in environment, try app_secrets.py
-if not DISCORD_BOT_TOKEN or not DISCORD_CHANNEL_ID:
+@lru_cache(maxsize=None)
+def discord_credentials(backend: str = None):
+    """
+    (bot token, channel ID, webhook URL) for the notifier backend, from the environment
+    or app_secrets.py. Resolved on first use, so commands that don't talk to Discord
+    run without credentials. Exits if the backend's credentials are missing.
+    """
+    backend = backend or NOTIFIER_BACKEND
+    # Try environment variables first
+    token = os.environ.get('DISCORD_BOT_TOKEN')
+    channel_id = os.environ.get('DISCORD_CHANNEL_ID')
+    webhook_url = os.environ.get('DISCORD_WEBHOOK_URL')
+
+    # If not found in environment, try app_secrets.py
+    if backend == 'fake':
+        # Nothing is sent, so no credentials are needed
+        pass
+    elif backend == 'webhook':
+        # The webhook backend only needs the webhook URL
+        if not webhook_url:
+            try:
+                from app_secrets import DISCORD_WEBHOOK_URL as webhook_url
+            except ImportError:
+                print("Error: Discord webhook URL not found!")
+                print("Please either:")
+                print("1. Set the DISCORD_WEBHOOK_URL environment variable")
+                print("2. Add DISCORD_WEBHOOK_URL to your app_secrets.py file")
+                sys.exit(1)
+    elif not token or not channel_id:
+        try:
+            from app_secrets import DISCORD_BOT_TOKEN as token, DISCORD_CHANNEL_ID as channel_id
+        except ImportError:
+            print("Error: Discord credentials not found!")
+            print("Please either:")
+            print("1. Set DISCORD_BOT_TOKEN and DISCORD_CHANNEL_ID environment variables")
+            print("2. Create a app_secrets.py file with these variables")
+            sys.exit(1)
+
+    # Convert channel ID to int (optional for the webhook and fake backends)
     try:
-        from app_secrets import DISCORD_BOT_TOKEN, DISCORD_CHANNEL_ID
-    except ImportError:
-        print("Error: Discord credentials not found!")
-        print("Please either:")
-        print("1. Set DISCORD_BOT_TOKEN and DISCORD_CHANNEL_ID environment variables")
-        print("2. Create a app_secrets.py file with these variables")
+        if channel_id or backend not in ('webhook', 'fake'):
+            channel_id = int(channel_id)
+    except (ValueError, TypeError):
+        print("Error: DISCORD_CHANNEL_ID must be a valid integer")
         sys.exit(1)
+    return token, channel_id, webhook_url
+
+# Scraper scheduling (number of scrapers run in parallel and per-scraper timeout in seconds)
+SCRAPER_CONCURRENCY = int(os.environ.get('SCRAPER_CONCURRENCY', 4))
+SCRAPER_TIMEOUT = float(os.environ.get('SCRAPER_TIMEOUT', 120))
+
+# Listing storage: 'sqlite' (listings.db, exported to listings.json) or
+# 'journal' (listings.json snapshot plus listings.journal.jsonl change log)
+LISTINGS_BACKEND = os.environ.get('LISTINGS_BACKEND', 'sqlite')
+
+# Daemon mode: seconds between runs of each scraper, and random jitter as a fraction of the interval
+DAEMON_DEFAULT_INTERVAL = float(os.environ.get('DAEMON_INTERVAL', 15 * 60))
+DAEMON_JITTER = float(os.environ.get('DAEMON_JITTER', 0.1))
+
+
+def daemon_interval(name: str) -> float:
+    """Interval of the scraper registered as name, from DAEMON_INTERVAL_<NAME> (e.g. DAEMON_INTERVAL_SUBO)"""
+    key = 'DAEMON_INTERVAL_' + name.upper().replace('-', '_')
+    return float(os.environ.get(key, DAEMON_DEFAULT_INTERVAL))
+
+
+# Per-user/per-channel alert filters (see README)
+SUBSCRIPTIONS_FILE = os.environ.get('SUBSCRIPTIONS_FILE', 'subscriptions.json')
 
-# Convert channel ID to int
-try:
-    DISCORD_CHANNEL_ID = int(DISCORD_CHANNEL_ID)
-except (ValueError, TypeError):
-    print("Error: DISCORD_CHANNEL_ID must be a valid integer")
-    sys.exit(1)
\ No newline at end of file
+# Adaptive scheduling (--adaptive): poll interval bounds in seconds, changes a poll should find on average,
+# days of listing history to learn from, and interval growth per run without changes
+SCHEDULER_MIN_INTERVAL = float(os.environ.get('SCHEDULER_MIN_INTERVAL', 5 * 60))
+SCHEDULER_MAX_INTERVAL = float(os.environ.get('SCHEDULER_MAX_INTERVAL', 3 * 60 * 60))
+SCHEDULER_TARGET_EVENTS = float(os.environ.get('SCHEDULER_TARGET_EVENTS', 0.5))
+SCHEDULER_HISTORY_DAYS = int(os.environ.get('SCHEDULER_HISTORY_DAYS', 28))
+SCHEDULER_BACKOFF = float(os.environ.get('SCHEDULER_BACKOFF', 1.5))
+SCHEDULE_STATE_FILE = os.environ.get('SCHEDULE_STATE_FILE', 'schedule.json')
@@ -0,0 +1,236 @@
+"""
+Offline stand-ins for Discord, used by NOTIFIER_BACKEND=fake and the benchmarks.
+
+FakeNotifier records what DiscordNotifier would send, edit and delete without any
+connection. FakeWebhookServer is a local HTTP server answering the webhook endpoints,
+so WebhookNotifier can run offline through discord.py's own HTTP layer.
+"""
+import asyncio
+import json
+
+import discord
+from aiohttp import web
+from discord.http import Route
+
+from config import FAKE_DISCORD_LOG
+from notifiers import DiscordNotifier
+
+
+def _json_response(data):
+    # discord.py only parses bodies whose Content-Type is exactly application/json (no charset)
+    return web.Response(body=json.dumps(data).encode(), headers={'Content-Type': 'application/json'})
+
+
+class FakeChannel:
+    """Records the messages DiscordNotifier would send, edit and delete, without a connection"""
+
+    def __init__(self, log=None, target=None):
+        self.log = log if log is not None else []
+        self.target = target
+        self.messages = {}
+
+    def _record(self, action, message_id, embeds=None):
+        entry = {'action': action, 'message_id': message_id}
+        if self.target is not None:
+            entry['target'] = self.target
+        if embeds is not None:
+            entry['titles'] = [embed.title for embed in embeds]
+        self.log.append(entry)
+
+    async def send(self, embeds):
+        # Snowflake IDs, so the message date can be read back like a real message's
+        message_id = discord.utils.time_snowflake(discord.utils.utcnow()) + len(self.log)
+        self.messages[message_id] = list(embeds)
+        self._record('send', message_id, embeds)
+        return FakeMessage(self, message_id)
+
+    def get_partial_message(self, message_id):
+        return FakeMessage(self, message_id)
+
+    async def fetch_message(self, message_id):
+        if message_id not in self.messages:
+            raise LookupError(f"Unknown message {message_id}")
+        return FakeMessage(self, message_id)
+
+    async def delete_messages(self, messages):
+        for message in messages:
+            await FakeMessage(self, message.id).delete()
+
+
+class FakeMessage:
+    def __init__(self, channel, message_id):
+        self.channel = channel
+        self.id = message_id
+
+    @property
+    def embeds(self):
+        return list(self.channel.messages.get(self.id, []))
+
+    async def edit(self, embeds):
+        self.channel.messages[self.id] = list(embeds)
+        self.channel._record('edit', self.id, embeds)
+
+    async def delete(self):
+        self.channel.messages.pop(self.id, None)
+        self.channel._record('delete', self.id)
+
+
+class FakeNotifier(DiscordNotifier):
+    """
+    DiscordNotifier that only records its calls in channel.log, for offline runs
+    (NOTIFIER_BACKEND=fake) and benchmarks. The log is written to log_path on close.
+    """
+
+    def __init__(self, channel_id=None, subscriptions=None, log_path=FAKE_DISCORD_LOG):
+        self.channel_id = channel_id or 0
+        self.subscriptions = subscriptions
+        self._destinations = {}
+        self.log_path = log_path
+        self.channel = FakeChannel()
+
+    async def ensure_connected(self):
+        pass
+
+    async def get_destination(self, subscription):
+        target = subscription.get('channel_id') or subscription.get('user_id') or subscription.get('webhook_url')
+        return FakeChannel(self.channel.log, target=target)
+
+    async def close(self):
+        if self.log_path:
+            with open(self.log_path, 'w', encoding='utf-8') as f:
+                json.dump(self.channel.log, f, indent=2, ensure_ascii=False)
+
+
+class FakeWebhookServer:
+    """
+    Local HTTP server for the Discord webhook endpoints WebhookNotifier uses: fetch the
+    webhook, execute with wait=true, and get, edit and delete a message. While running,
+    discord.py's API base URL points at it, so requests go through discord.Webhook,
+    the aiohttp session and the response parsing exactly as against Discord.
+    Requests are logged like FakeChannel's, each answered after latency seconds.
+    """
+
+    WEBHOOK_ID = 112233445566778899
+    CHANNEL_ID = 998877665544332211
+    TOKEN = 'fake-webhook-token-' + 'x' * 60
+
+    def __init__(self, latency=0.0):
+        self.latency = latency
+        self.log = []
+        self.messages = {}
+        self._runner = None
+        self._base = None
+
+    @property
+    def webhook_url(self):
+        # Parsed by discord.Webhook.from_url, which only accepts discord.com URLs
+        return f"https://discord.com/api/webhooks/{self.WEBHOOK_ID}/{self.TOKEN}"
+
+    async def start(self):
+        prefix = '/api/v10/webhooks/{webhook_id}/{token}'
+        app = web.Application()
+        app.router.add_get(prefix, self.get_webhook)
+        app.router.add_post(prefix, self.execute)
+        app.router.add_get(prefix + '/messages/{message_id}', self.get_message)
+        app.router.add_patch(prefix + '/messages/{message_id}', self.edit_message)
+        app.router.add_delete(prefix + '/messages/{message_id}', self.delete_message)
+        self._runner = web.AppRunner(app)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, '127.0.0.1', 0)
+        await site.start()
+        port = self._runner.addresses[0][1]
+        self._base = Route.BASE
+        Route.BASE = f"http://127.0.0.1:{port}/api/v10"
+
+    async def stop(self):
+        Route.BASE = self._base
+        await self._runner.cleanup()
+
+    async def __aenter__(self):
+        await self.start()
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.stop()
+
+    def _record(self, action, message_id, embeds=None):
+        entry = {'action': action, 'message_id': message_id}
+        if embeds is not None:
+            entry['titles'] = [embed.get('title') for embed in embeds]
+        self.log.append(entry)
+
+    def _message(self, message_id):
+        return {
+            'id': str(message_id),
+            'channel_id': str(self.CHANNEL_ID),
+            'webhook_id': str(self.WEBHOOK_ID),
+            'type': 0,
+            'content': '',
+            'author': {'id': str(self.WEBHOOK_ID), 'username': 'fake', 'discriminator': '0000', 'avatar': None,
+                       'bot': True},
+            'embeds': self.messages[message_id],
+            'attachments': [],
+            'mentions': [],
+            'mention_roles': [],
+            'pinned': False,
+            'mention_everyone': False,
+            'tts': False,
+            'timestamp': discord.utils.snowflake_time(message_id).isoformat(),
+            'edited_timestamp': None,
+            'flags': 0,
+            'components': [],
+        }
+
+    async def _respond(self, request):
+        if request.match_info['token'] != self.TOKEN or int(request.match_info['webhook_id']) != self.WEBHOOK_ID:
+            raise web.HTTPUnauthorized()
+        if self.latency:
+            await asyncio.sleep(self.latency)
+
+    def _message_id(self, request):
+        message_id = int(request.match_info['message_id'])
+        if message_id not in self.messages:
+            raise web.HTTPNotFound(body=json.dumps({'message': 'Unknown Message', 'code': 10008}).encode(),
+                                   headers={'Content-Type': 'application/json'})
+        return message_id
+
+    async def get_webhook(self, request):
+        await self._respond(request)
+        return _json_response({
+            'id': str(self.WEBHOOK_ID),
+            'type': 1,
+            'token': self.TOKEN,
+            'channel_id': str(self.CHANNEL_ID),
+            'guild_id': None,
+            'name': 'fake',
+            'avatar': None,
+        })
+
+    async def execute(self, request):
+        await self._respond(request)
+        embeds = (await request.json()).get('embeds', [])
+        message_id = discord.utils.time_snowflake(discord.utils.utcnow()) + len(self.log)
+        self.messages[message_id] = embeds
+        self._record('send', message_id, embeds)
+        # discord.py sends wait=1, the API docs use wait=true
+        if request.query.get('wait') not in ('1', 'true'):
+            return web.Response(status=204)
+        return _json_response(self._message(message_id))
+
+    async def get_message(self, request):
+        await self._respond(request)
+        return _json_response(self._message(self._message_id(request)))
+
+    async def edit_message(self, request):
+        await self._respond(request)
+        message_id = self._message_id(request)
+        self.messages[message_id] = (await request.json()).get('embeds', [])
+        self._record('edit', message_id, self.messages[message_id])
+        return _json_response(self._message(message_id))
+
+    async def delete_message(self, request):
+        await self._respond(request)
+        message_id = self._message_id(request)
+        del self.messages[message_id]
+        self._record('delete', message_id)
+        return web.Response(status=204)
@@ -1,26 +1,25 @@
-import requests
-from bs4 import BeautifulSoup
-import os
-import json
-import discord
-from discord import Embed # Removed duplicate import
 import asyncio
 import argparse # Removed duplicate import
-from config import DISCORD_BOT_TOKEN, DISCORD_CHANNEL_ID
-from utils import format_notification_title
+import time
+import random
+import threading
+from config import (SCRAPER_CONCURRENCY, SCRAPER_TIMEOUT, LISTINGS_BACKEND,
+                    DAEMON_JITTER, daemon_interval)
+from utils import MAX_EMBEDS_PER_MESSAGE
+from storage import open_store
+from scheduler import AdaptiveScheduler
+from archive import ListingArchive, split_retained, RETENTION_DAYS
 from datetime import datetime
-# Assuming scraper classes are in scrapers/subo.py and scrapers/dios.py
-from scrapers.subo import SuboScraper
-from scrapers.dios import DiosScraper
+# Scraper modules are imported by the registry when selected
+from scrapers.registry import get_scraper, scraper_names, source_name
+from scrapers.dedup import DuplicateIndex, merge_duplicate
+from scrapers.metrics import metrics, print_report
 
 DEBUG_OUTPUT_DIR = "debug_output"
 OUTPUT_JSON_FILE = "listings.json"
-
-# Initialize scrapers
-ALL_SCRAPERS = {
-    'subo': SuboScraper(),
-    'dios': DiosScraper()
-}
+LISTINGS_DB_FILE = "listings.db"
+# Seconds between checks for scrapers that have run past their timeout
+SUPERVISE_INTERVAL = 0.05
 
 def parse_args():
     parser = argparse.ArgumentParser()
@@ -28,281 +27,93 @@ def parse_args():
     parser.add_argument('--remove', type=str, help='Address of listing to simulate removal')
     parser.add_argument('--recheck', action='store_true', help='Recheck inactive listings and reactivate if available')
     parser.add_argument('--clear', action='store_true', help='Delete all existing Discord messages')
-    parser.add_argument('--subo', action='store_true', help='Run only SUBO scraper')
-    parser.add_argument('--dios', action='store_true', help='Run only Dios scraper')
+    parser.add_argument('--concurrency', type=int, default=SCRAPER_CONCURRENCY, help='Maximum number of scrapers to run in parallel')
+    parser.add_argument('--timeout', type=float, default=SCRAPER_TIMEOUT, help='Per-scraper timeout in seconds')
+    parser.add_argument('--daemon', action='store_true', help='Keep running and scrape each site on its own interval')
+    parser.add_argument('--adaptive', action='store_true', help="Poll each site on an interval learned from its publish history")
+    parser.add_argument('--archive-search', metavar='TEXT', nargs='?', const='', help='Search archived listings by address or URL and exit')
+    parser.add_argument('--since', help='Only archived listings removed on or after this date (YYYY-MM-DD)')
+    parser.add_argument('--until', help='Only archived listings removed on or before this date (YYYY-MM-DD)')
+    # One flag per registered scraper (--subo, --dios, sites/*.json, entry points)
+    scrapers = parser.add_argument_group('scrapers', 'Run only the selected scrapers (default: all)')
+    for name in scraper_names():
+        try:
+            scrapers.add_argument(f'--{name}', dest=f'scraper_{name}', action='store_true', help=f'Run the {name} scraper')
+        except argparse.ArgumentError:
+            print(f"Scraper {name} has the same name as a command-line option, so it has no flag of its own")
     return parser.parse_args()
 
 def get_active_scrapers(args):
-    if args.subo:
-        print("Running SUBO scraper only")
-        return [ALL_SCRAPERS['subo']]
-    elif args.dios:
-        print("Running Dios scraper only")
-        return [ALL_SCRAPERS['dios']]
+    # Names of the selected scrapers; their modules are only imported by get_scraper
+    selected = [name for name in scraper_names() if getattr(args, f'scraper_{name}', False)]
+    if selected:
+        print(f"Running only: {', '.join(selected)}")
+        return selected
     print("Running all scrapers")
-    return ALL_SCRAPERS.values()
-
-class DiscordNotifier:
-    def __init__(self, token, channel_id):
-        self.token = token
-        self.channel_id = channel_id
-        intents = discord.Intents.default()
-        # Enable the message_content intent if needed for fetching messages
-        # intents.message_content = True
-        self.client = discord.Client(intents=intents)
-        self._ready = asyncio.Event()
-        self.channel = None
-
-        @self.client.event
-        async def on_ready():
-            self.channel = self.client.get_channel(self.channel_id)
-            self._ready.set()
-
-    async def connect(self):
-        try:
-            # Use run instead of start to keep the bot running for async operations
-            await self.client.start(self.token)
-        except Exception as e:
-            print(f"Failed to connect to Discord: {e}")
-            raise
-
-    async def ensure_connected(self):
-        # Check if the client is already connected and ready
-        if not self.client.is_ready():
-             # If not ready, start the client in a separate task
-            connect_task = asyncio.create_task(self.client.start(self.token))
-            try:
-                # Wait for the on_ready event to be set
-                await asyncio.wait_for(self._ready.wait(), timeout=30)
-            except asyncio.TimeoutError:
-                # If timeout occurs, cancel the connection task and raise an error
-                connect_task.cancel()
-                raise TimeoutError("Failed to connect to Discord within 30 seconds")
-
-        # Ensure the channel object is available
-        if not self.channel:
-            self.channel = self.client.get_channel(self.channel_id)
-            if not self.channel:
-                raise ValueError(f"Could not find channel with ID {self.channel_id}")
-
-
-    async def send_notification(self, listing):
-        # Ensure the bot is connected before sending
-        await self.ensure_connected()
-
-        # Title formatting with proper emoji spacing for strikethrough
-        title = format_notification_title(listing['url'])
-        # Apply strikethrough only if the listing is marked as inactive
-        if not listing.get('active', True):
-            # Split emoji and text to prevent emoji from being struck through
-            parts = title.split(' ', 1)
-            # Reconstruct title with strikethrough on the text part
-            title = f"{parts[0]} ~~{parts[1]}~~"
-
-        # Create the embed message
-        embed = Embed(
-            title=title,
-            # Set URL only if the listing is active
-            url=listing['url'] if listing.get('active', True) else None,
-            # Set color based on active status
-            color=discord.Color.green() if listing.get('active', True) else discord.Color.red()
-        )
-
-        # Define formatting for field values and names (with conditional strikethrough)
-        value_format = "```{}```" # Use code block for values
-        name_format = "{}" if listing.get('active', True) else "~~{}~~" # Apply strikethrough to names if inactive
-
-        # Determine the text for the 'Ledigt' field
-        available_text = listing.get('available', 'N/A') # Use .get for safety
-        # If inactive, show removal date instead of availability
-        if not listing.get('active', True):
-            # Use the 'removed_at' field if available, otherwise use current date
-            removal_date = listing.get('removed_at', datetime.now().strftime('%Y-%m-%d'))
-            available_text = f"Borttagen {removal_date}"
-
-        # Add fields to the embed
-        embed.add_field(name=name_format.format("Adress"), value=value_format.format(listing.get('address', 'N/A')), inline=False)
-        embed.add_field(name=name_format.format("Rum"), value=value_format.format(listing.get('rooms', 'N/A')), inline=True)
-        embed.add_field(name=name_format.format("Storlek"), value=value_format.format(listing.get('size', 'N/A')), inline=True)
-        embed.add_field(name=name_format.format("Hyra"), value=value_format.format(listing.get('price', 'N/A')), inline=True)
-        embed.add_field(name=name_format.format("Ledigt"), value=value_format.format(available_text), inline=False)
-
-        # Handle image if URL is provided
-        if listing.get('image_url'):
-            embed.set_image(url=listing.get('image_url'))
-
-        try:
-            # Send the embed message to the channel
-            msg = await self.channel.send(embed=embed)
-            # Store the message ID and channel ID in the listing data
-            listing['message_id'] = msg.id
-            listing['channel_id'] = self.channel_id
-            # Note: The listings list is updated in the main execution block
-            # after all notifications are processed for better file handling.
-            return msg
-        except Exception as e:
-            print(f"Error sending message for {listing.get('address', 'Unknown')}: {e}")
-            return None # Return None if sending fails
-
-    async def update_removed_listing(self, listing):
-        # Ensure the bot is connected and the listing has a message ID
-        if 'message_id' not in listing:
-            print(f"Skipping update for removed listing with no message_id: {listing.get('address', 'Unknown')}")
-            return
-
-        await self.ensure_connected()
+    return scraper_names()
 
-        try:
-            # Fetch the original message from Discord
-            message = await self.channel.fetch_message(listing['message_id'])
-            # Get the existing embed
-            embed = message.embeds[0]
-
-            # Apply strikethrough to the title text (preserving emoji)
-            title = embed.title
-            parts = title.split(' ', 1)
-            embed.title = f"{parts[0]} ~~{parts[1]}~~"
-
-            # Remove the URL and change color to red
-            embed.url = None
-            embed.color = discord.Color.red()
-
-            # Clear existing fields before adding updated ones
-            embed.clear_fields()
-
-            # Re-add fields with strikethrough names and current date for availability
-            current_date = datetime.now().strftime('%Y-%m-%d')
-            embed.add_field(name="~~Adress~~", value=f"```{listing.get('address', 'N/A')}```", inline=False)
-            embed.add_field(name="~~Rum~~", value=f"```{listing.get('rooms', 'N/A')}```", inline=True)
-            embed.add_field(name="~~Storlek~~", value=f"```{listing.get('size', 'N/A')}```", inline=True)
-            embed.add_field(name="~~Hyra~~", value=f"```{listing.get('price', 'N/A')}```", inline=True)
-            embed.add_field(name="~~Ledigt~~", value=f"```Borttagen {current_date}```", inline=False)
-
-            # Edit the message with the updated embed
-            await message.edit(embed=embed)
-            print(f"Successfully updated removed listing message for: {listing.get('address', 'Unknown')}")
-        except discord.errors.NotFound:
-             print(f"Message with ID {listing['message_id']} not found for removed listing: {listing.get('address', 'Unknown')}")
-        except Exception as e:
-            print(f"Error updating removed listing message for {listing.get('address', 'Unknown')}: {e}")
-
-
-    async def update_reactivated_listing(self, listing):
-        # Ensure the bot is connected and the listing has a message ID
-        if 'message_id' not in listing:
-            print(f"Skipping update for reactivated listing with no message_id: {listing.get('address', 'Unknown')}")
-            return
+def create_notifier():
+    # discord.py takes longer to import than the rest of the program, so it's only loaded
+    # by the commands that talk to Discord
+    from notifiers import create_notifier as create_backend_notifier
+    return create_backend_notifier()
 
-        await self.ensure_connected()
-
-        try:
-            # Fetch the original message
-            message = await self.channel.fetch_message(listing['message_id'])
-
-            # Create a new embed for the reactivated listing
-            embed = Embed(
-                title=format_notification_title(listing['url']), # Use original title format
-                url=listing['url'], # Restore the URL
-                color=discord.Color.green() # Change color back to green
-            )
-
-            # Add fields with current data (no strikethrough)
-            embed.add_field(name="Adress", value=f"```{listing.get('address', 'N/A')}```", inline=False)
-            embed.add_field(name="Rum", value=f"```{listing.get('rooms', 'N/A')}```", inline=True)
-            embed.add_field(name="Storlek", value=f"```{listing.get('size', 'N/A')}```", inline=True)
-            embed.add_field(name="Hyra", value=f"```{listing.get('price', 'N/A')}```", inline=True)
-            embed.add_field(name="Ledigt", value=f"```{listing.get('available', 'N/A')}```", inline=False)
-
-            # Set image if URL is provided
-            if listing.get('image_url'):
-                embed.set_image(url=listing.get('image_url'))
-                print(f"Setting image for reactivated listing: {listing['image_url']}")
-
-            # Edit the message with the new embed
-            await message.edit(embed=embed)
-            print(f"Successfully updated reactivated listing message for: {listing.get('address', 'Unknown')}")
-        except discord.errors.NotFound:
-             print(f"Message with ID {listing['message_id']} not found for reactivated listing: {listing.get('address', 'Unknown')}")
-        except Exception as e:
-            print(f"Error updating reactivated listing message for {listing.get('address', 'Unknown')}: {e}")
+class LazyNotifier:
+    """Creates the notifier on first use, so runs that find no changes never import discord.py"""
 
+    def __init__(self):
+        self._notifier = None
 
-    async def clear_messages(self, listings):
-        await self.ensure_connected()
-        deleted_count = 0
-
-        # Collect all message IDs first
-        message_ids = [(listing.get('message_id'), listing) for listing in listings if listing.get('message_id')]
-        print(f"Found {len(message_ids)} message IDs to delete")
-
-        for msg_id, listing in message_ids:
-            if msg_id: # Ensure msg_id is not None
-                try:
-                    # Fetch and delete the message
-                    message = await self.channel.fetch_message(msg_id)
-                    await message.delete()
-                    deleted_count += 1
-                    print(f"Deleted message ID {msg_id} for: {listing.get('address', 'Unknown')} | {listing.get('size', 'N/A')} | {listing.get('rooms', 'N/A')}")
-
-                except discord.errors.NotFound:
-                    print(f"Message with ID {msg_id} not found for deletion (already deleted?): {listing.get('address', 'Unknown')}")
-                except Exception as e:
-                    print(f"Failed to delete message with ID {msg_id} for {listing.get('address', 'Unknown')}: {e}")
-
-        # Clear message IDs from listings data in memory
-        for listing in listings:
-            if 'message_id' in listing:
-                del listing['message_id']
-            if 'channel_id' in listing:
-                del listing['channel_id']
-
-        # Write updated listings (without message IDs) back to JSON
-        # This happens in the main execution block after the clear operation completes.
-        return deleted_count
+    def __getattr__(self, name):
+        if self._notifier is None:
+            self._notifier = create_notifier()
+        return getattr(self._notifier, name)
 
     async def close(self):
-        # Close the Discord client connection
-        if self.client and not self.client.is_closed():
-            await self.client.close()
-
-async def handle_discord_operations(new_listings=None, removed_listings=None, reactivated_listings=None):
+        if self._notifier is not None:
+            await self._notifier.close()
+
+async def merge_duplicate_listings(notifier, duplicates, all_listings=None):
+    # Point each duplicate at its original's message and re-render that message instead of re-posting
+    for listing, original in duplicates:
+        print(f"Merging {listing['url']} into {original['url']}")
+        merge_duplicate(listing, original)
+    await notifier.update_listing_messages([listing for listing, _ in duplicates], all_listings)
+
+async def send_new_listings(notifier, new_listings):
+    print(f"Sending {len(new_listings)} new listings...")
+    for listing in new_listings:
+        print(f"Sending notification for: {listing.get('address', 'Unknown')} | {listing.get('size', 'N/A')} | {listing.get('rooms', 'N/A')}")
+    # send_notifications updates each listing object with message_id, channel_id and embed_index
+    messages = await notifier.send_notifications(new_listings)
+    print(f"Sent {len(new_listings)} listings in {len(messages)} messages")
+    # Route copies to the subscriptions whose filters match
+    await notifier.send_subscription_alerts(new_listings)
+
+async def update_changed_listings(notifier, removed_listings=None, reactivated_listings=None, all_listings=None):
+    # Update messages for reactivated and removed listings, one edit per message
+    changed_listings = list(reactivated_listings or []) + list(removed_listings or [])
+    if changed_listings:
+        print(f"Updating {len(reactivated_listings or [])} reactivated and {len(removed_listings or [])} removed listings...")
+        await notifier.update_listing_messages(changed_listings, all_listings)
+
+async def notify_changes(notifier, new_listings=None, removed_listings=None, reactivated_listings=None, all_listings=None):
+    # Ensure the bot is connected before processing notifications
+    await notifier.ensure_connected()
+    print(f"\nProcessing Discord notifications:")
+
+    # Send notifications for new listings
+    if new_listings:
+        await send_new_listings(notifier, new_listings)
+    await update_changed_listings(notifier, removed_listings, reactivated_listings, all_listings)
+
+async def handle_discord_operations(new_listings=None, removed_listings=None, reactivated_listings=None, all_listings=None):
     # Create a DiscordNotifier instance
-    notifier = DiscordNotifier(DISCORD_BOT_TOKEN, DISCORD_CHANNEL_ID)
+    notifier = create_notifier()
 
     # Use a try...finally block to ensure the client is closed
     try:
-        # Ensure the bot is connected before processing notifications
-        await notifier.ensure_connected()
-        print(f"\nProcessing Discord notifications:")
-
-        # Send notifications for new listings
-        if new_listings:
-            print(f"Sending {len(new_listings)} new listings...")
-            for listing in new_listings:
-                print(f"Sending notification for: {listing.get('address', 'Unknown')} | {listing.get('size', 'N/A')} | {listing.get('rooms', 'N/A')}")
-                # send_notification updates the listing object with message_id and channel_id
-                await notifier.send_notification(listing)
-                # Add a small delay to avoid hitting Discord rate limits
-                await asyncio.sleep(1)
-
-        # Update messages for reactivated listings
-        if reactivated_listings:
-            print(f"Updating {len(reactivated_listings)} reactivated listings...")
-            for listing in reactivated_listings:
-                 print(f"Updating reactivated listing message for: {listing.get('address', 'Unknown')}")
-                 await notifier.update_reactivated_listing(listing)
-                 # Add a small delay
-                 await asyncio.sleep(1)
-
-        # Update messages for removed listings
-        if removed_listings:
-            print(f"Updating {len(removed_listings)} removed listings...")
-            for listing in removed_listings:
-                print(f"Updating removed listing message for: {listing.get('address', 'Unknown')}")
-                await notifier.update_removed_listing(listing)
-                # Add a small delay
-                await asyncio.sleep(1)
-
+        await notify_changes(notifier, new_listings, removed_listings, reactivated_listings, all_listings)
     except Exception as e:
         print(f"Error in Discord operations: {e}")
     finally:
@@ -310,20 +121,129 @@ async def handle_discord_operations(new_listings=None, removed_listings=None, re
         await notifier.close()
 
 
-def scrape_all_sites(existing_listings, scrapers):
+def _run_scraper(scraper, existing_listings, on_new=None, cancelled=None):
+    # Run a single scraper and report how long it took
+    name = scraper.source
+    print(f"\nRunning {name}")
+    started = time.monotonic()
+    # The scraper's stream is diffed against existing_listings to determine
+    # new, removed, and reactivated listings; on_new is called for each new one.
+    with metrics.span(name, 'total'):
+        result = scraper.stream(existing_listings, on_new, cancelled)
+    print(f"{name} finished in {time.monotonic() - started:.2f}s")
+    return result
+
+class ScraperRun:
+    """
+    One scraper running in its own daemon thread once one of the concurrency slots
+    is free. Daemon threads aren't joined at exit, so a scraper that hangs past its
+    timeout doesn't keep the process alive, and giving up its slot lets the next start.
+    New listings passed to on_new are kept in found, so they survive a timeout.
+    """
+
+    def __init__(self, scraper, existing_listings, on_new, slots):
+        self.scraper = scraper
+        self.existing_listings = existing_listings
+        self.on_new = on_new
+        self.slots = slots
+        # When the scraper got a slot and started; its timeout counts from here
+        self.started = None
+        self.result = None
+        self.error = None
+        # New listings already passed on to on_new (and possibly sent to Discord)
+        self.found = []
+        self.done = threading.Event()
+        # Set when the caller gives up on the run; the scraper then doesn't commit its page
+        self.cancelled = threading.Event()
+        self._released = False
+        self._lock = threading.Lock()
+        self.thread = threading.Thread(target=self._run, name=f"scraper-{scraper.source}", daemon=True)
+
+    def _run(self):
+        self.slots.acquire()
+        self.started = time.monotonic()
+        try:
+            self.result = _run_scraper(self.scraper, self.existing_listings, self._on_new, self.cancelled)
+        except Exception as e:
+            self.error = e
+        finally:
+            self.release()
+            self.done.set()
+
+    def _on_new(self, listing):
+        # Once abandoned, the caller has moved on; listings found later are left for the next run
+        with self._lock:
+            if self.cancelled.is_set():
+                return
+            self.found.append(listing)
+            if self.on_new:
+                self.on_new(listing)
+
+    def release(self):
+        # Called by the thread when it finishes, or by the caller when it times out
+        with self._lock:
+            if not self._released:
+                self._released = True
+                self.slots.release()
+
+    def abandon(self):
+        """Stop passing on the listings of a timed-out scraper and free its slot"""
+        with self._lock:
+            self.cancelled.set()
+        self.release()
+
+    def timed_out(self, timeout):
+        return not self.done.is_set() and self.started is not None and time.monotonic() - self.started > timeout
+
+def scrape_all_sites(existing_listings, scrapers, concurrency=SCRAPER_CONCURRENCY, timeout=SCRAPER_TIMEOUT, on_new=None):
     print(f"\nStarting scrape with {len(existing_listings)} existing listings")
+    scrapers = list(scrapers)
     all_listings = []
     all_new = []
     all_removed = []
     all_reactivated = []
 
-    # Iterate through each scraper
-    for scraper in scrapers:
-        print(f"\nRunning {scraper.__class__.__name__}")
-        # Call the scraper's scrape method, passing the existing listings
-        # The scraper is responsible for comparing current scrape results
-        # against existing_listings to determine new, removed, and reactivated.
-        listings, new, removed, reactivated = scraper.scrape(existing_listings)
+    # Run scrapers in parallel, at most concurrency at a time; each one only touches listings from its own source
+    slots = threading.Semaphore(max(1, concurrency))
+    runs = [ScraperRun(scraper, existing_listings, on_new, slots) for scraper in scrapers]
+    for run in runs:
+        run.thread.start()
+
+    # Time out every scraper that runs too long, not just the one being waited for, so a
+    # hung scraper can't hold a slot that an earlier one in the list is waiting for
+    pending = set(runs)
+    timed_out = set()
+    while pending:
+        for run in list(pending):
+            if run.done.is_set():
+                pending.discard(run)
+            elif run.timed_out(timeout):
+                print(f"{run.scraper.source} timed out after {timeout:g}s, keeping its stored listings")
+                metrics.count(run.scraper.source, 'timeouts')
+                # Let a queued scraper start; the thread itself can't be stopped
+                run.abandon()
+                pending.discard(run)
+                timed_out.add(run)
+        if pending:
+            time.sleep(SUPERVISE_INTERVAL)
+
+    # Merge in scraper order (not completion order) so output is deterministic
+    for run in runs:
+        name = run.scraper.source
+        if run in timed_out:
+            # Copies, since the scraper thread may still finish and mark the originals removed,
+            # plus the new listings it had already found, which may have been sent to Discord
+            all_listings.extend(l.copy() for l in existing_listings if l.get('source') == name)
+            all_listings.extend(run.found)
+            all_new.extend(run.found)
+            continue
+        if run.error is not None:
+            print(f"Error running {name}: {run.error}, keeping its stored listings")
+            all_listings.extend(l for l in existing_listings if l.get('source') == name)
+            all_listings.extend(run.found)
+            all_new.extend(run.found)
+            continue
+        listings, new, removed, reactivated = run.result
         # Extend the main lists with results from the current scraper
         all_listings.extend(listings)
         all_new.extend(new)
@@ -338,65 +258,258 @@ def scrape_all_sites(existing_listings, scrapers):
 
     return all_listings, all_new, all_removed, all_reactivated
 
+async def scrape_and_notify(notifier, existing_listings, scrapers, concurrency=SCRAPER_CONCURRENCY, timeout=SCRAPER_TIMEOUT):
+    """
+    Scrape all sites in a worker thread and send new listings to Discord as soon as
+    the scrapers find them. Removed and reactivated listings are updated once
+    scraping is done, since removals are only known at the end, and so are new
+    listings that may be an existing one under a new URL on the same site.
+    """
+    loop = asyncio.get_running_loop()
+    queue = asyncio.Queue()
+    # Stored listings (any source) that a re-posted or cross-posted listing can be merged into
+    duplicate_index = DuplicateIndex(existing_listings)
+    # Listings merged into; their messages already show the duplicate, so their removal needs no edit
+    merged_urls = set()
+
+    def on_new(listing):
+        # Called from the scraper threads
+        if loop.is_closed():
+            return
+        try:
+            loop.call_soon_threadsafe(queue.put_nowait, listing)
+        except RuntimeError:
+            # The loop closed in the meantime
+            pass
+
+    async def send(batch):
+        fresh, duplicates = duplicate_index.split(batch)
+        merged_urls.update(original['url'] for _, original in duplicates)
+        try:
+            if fresh:
+                await send_new_listings(notifier, fresh)
+            if duplicates:
+                await merge_duplicate_listings(notifier, duplicates, list(existing_listings) + fresh)
+        except Exception as e:
+            print(f"Error in Discord operations: {e}")
+
+    scrape_task = asyncio.ensure_future(asyncio.to_thread(
+        scrape_all_sites, existing_listings, scrapers, concurrency, timeout, on_new
+    ))
+    while True:
+        getter = asyncio.ensure_future(queue.get())
+        await asyncio.wait({getter, scrape_task}, return_when=asyncio.FIRST_COMPLETED)
+        if not getter.done():
+            getter.cancel()
+            break
+        # Send what has arrived so far, up to one message worth of embeds
+        batch = [getter.result()]
+        while not queue.empty() and len(batch) < MAX_EMBEDS_PER_MESSAGE:
+            batch.append(queue.get_nowait())
+        await send(batch)
+
+    # Listings queued while the last scraper was finishing
+    remaining = []
+    while not queue.empty():
+        remaining.append(queue.get_nowait())
+    if remaining:
+        await send(remaining)
+
+    all_listings, new, removed, reactivated = await scrape_task
+    # Listings held back as possibly moved to a new URL on their own site: merged into
+    # the old listing's message if it was removed in this scrape, sent otherwise
+    fresh, moved = duplicate_index.resolve_pending(removed)
+    merged_urls.update(original['url'] for _, original in moved)
+    try:
+        if fresh:
+            await send_new_listings(notifier, fresh)
+        if moved:
+            await merge_duplicate_listings(notifier, moved, all_listings)
+        await update_changed_listings(notifier, [listing for listing in removed if listing['url'] not in merged_urls],
+                                      reactivated, all_listings)
+    except Exception as e:
+        print(f"Error in Discord operations: {e}")
+    return all_listings, new, removed, reactivated
+
+async def run_scrape(existing_listings, scrapers, concurrency=SCRAPER_CONCURRENCY, timeout=SCRAPER_TIMEOUT):
+    # One-shot scrape with its own notifier, closed when done
+    notifier = LazyNotifier()
+    try:
+        return await scrape_and_notify(notifier, existing_listings, scrapers, concurrency, timeout)
+    finally:
+        await notifier.close()
+
+def save_listings(store, listings):
+    # Only listings that changed since the last load/save are written
+    try:
+        with metrics.span('storage', 'save'):
+            written = store.save(listings)
+        metrics.count('storage', 'rows_written', written)
+        print(f"Successfully stored {len(listings)} listings ({written} changed) using the {LISTINGS_BACKEND} backend")
+    except Exception as e:
+        print(f"Error writing listings: {e}")
+
+def write_metrics():
+    # Metrics report for this run, plus the rolling history it's compared against
+    try:
+        print_report(metrics.write())
+    except Exception as e:
+        print(f"Error writing metrics: {e}")
+    metrics.reset()
+
+def archive_expired_listings(listings):
+    # Move inactive listings past the retention window out of the working set, so what is
+    # loaded, diffed and saved each run doesn't grow with the history
+    kept, expired = split_retained(listings)
+    if not expired:
+        return listings
+    try:
+        with metrics.span('storage', 'archive'):
+            ListingArchive().append(expired)
+    except Exception as e:
+        print(f"Error archiving listings: {e}")
+        return listings
+    metrics.count('storage', 'archived', len(expired))
+    print(f"Archived {len(expired)} listings removed more than {RETENTION_DAYS} days ago")
+    return kept
+
+def search_archive(text, since=None, until=None):
+    found = 0
+    for listing in ListingArchive().query(text=text or None, since=since, until=until):
+        found += 1
+        print(f"{listing.get('removed_at') or '?'} | {listing.get('source')} | {listing.get('address', 'N/A')} | "
+              f"{listing.get('rooms', 'N/A')} | {listing.get('size', 'N/A')} | {listing.get('price', 'N/A')} | {listing.get('url')}")
+    print(f"Found {found} archived listings")
+
+def get_due_scrapers(scheduler, names):
+    # With frequent cron runs, a site is scraped only when its adaptive interval has passed.
+    # Half the minimum interval of slack so cron timing jitter doesn't skip a run.
+    due = []
+    for name in names:
+        source = source_name(name)
+        if scheduler.is_due(source, slack=scheduler.min_interval / 2):
+            due.append(name)
+        else:
+            print(f"Skipping {source}, next run due at {scheduler.next_run(source):%H:%M}")
+    return due
+
+def record_scheduled_runs(scheduler, scrapers, new, removed, reactivated, listings):
+    # A run counts as changed if it found any new, removed or reactivated listing for the source
+    changed_sources = {l.get('source') for l in list(new) + list(removed) + list(reactivated)}
+    for scraper in scrapers:
+        source = scraper.source
+        scheduler.record_run(source, source in changed_sources)
+    scheduler.learn(listings)
+    try:
+        scheduler.save()
+    except OSError as e:
+        print(f"Error saving schedule state: {e}")
+
+def _next_run(interval, jitter):
+    # Spread runs out by +/- jitter * interval so we don't hit sites on a fixed beat
+    return time.monotonic() + interval * (1 + random.uniform(-jitter, jitter))
+
+async def run_daemon(args, store, listings):
+    # Keep one Discord connection and the scrapers' HTTP sessions alive, and run
+    # each scraper on its own interval with listing state kept in memory
+    scrapers = {name: get_scraper(name) for name in get_active_scrapers(args)}
+    next_runs = {key: time.monotonic() for key in scrapers}
+    notifier = create_notifier()
+    scheduler = None
+    if args.adaptive:
+        scheduler = AdaptiveScheduler()
+        scheduler.learn(listings)
+        print("Starting daemon with adaptive intervals")
+    else:
+        print("Starting daemon with intervals: " + ', '.join(f"{key}={daemon_interval(key):g}s" for key in scrapers))
+
+    try:
+        await notifier.ensure_connected()
+        while True:
+            # Sleep until the next scraper is due
+            await asyncio.sleep(max(0, min(next_runs.values()) - time.monotonic()))
+            now = time.monotonic()
+            # Don't count the time spent sleeping in this cycle's metrics
+            metrics.reset()
+            due = [key for key, next_run in next_runs.items() if next_run <= now]
+            for key in due:
+                next_runs[key] = _next_run(daemon_interval(key), DAEMON_JITTER)
+
+            # Scraping runs in a worker thread so the Discord connection keeps its heartbeat
+            scraped, new, removed, reactivated = await scrape_and_notify(
+                notifier, listings, [scrapers[key] for key in due],
+                concurrency=args.concurrency, timeout=args.timeout
+            )
+            # Replace the state of the sources that just ran, keep the rest
+            ran_sources = {scrapers[key].source for key in due}
+            listings = [l for l in listings if l.get('source') not in ran_sources] + scraped
+            listings = archive_expired_listings(listings)
+            # Includes the message IDs assigned while sending notifications
+            save_listings(store, listings)
+            if scheduler:
+                # Learn from this cycle's changes and schedule the next run of each scraper that ran
+                record_scheduled_runs(scheduler, [scrapers[key] for key in due], new, removed, reactivated, listings)
+                for key in due:
+                    interval = scheduler.interval(scrapers[key].source)
+                    next_runs[key] = _next_run(interval, DAEMON_JITTER)
+                    print(f"Next {key} run in {interval / 60:.0f} minutes")
+            # One metrics report per cycle
+            write_metrics()
+    finally:
+        await notifier.close()
+
 if __name__ == "__main__":
     args = parse_args()
 
-    # Load existing listings from the JSON file at the start of the script
-    existing_listings = []
-    if os.path.exists(OUTPUT_JSON_FILE):
-        try:
-            with open(OUTPUT_JSON_FILE, "r", encoding="utf-8") as f:
-                # Load existing listings, handling potential empty file
-                file_content = f.read()
-                if file_content:
-                    existing_listings = json.loads(file_content)
-                else:
-                    existing_listings = [] # Initialize as empty list if file is empty
-        except json.JSONDecodeError:
-            print(f"Error decoding JSON from {OUTPUT_JSON_FILE}. Starting with empty listings.")
-            existing_listings = [] # Initialize as empty list on error
-        except Exception as e:
-            print(f"Error loading {OUTPUT_JSON_FILE}: {e}. Starting with empty listings.")
-            existing_listings = [] # Initialize as empty list on other errors
+    # Archive queries only read the archive files
+    if args.archive_search is not None:
+        search_archive(args.archive_search, since=args.since, until=args.until)
+        exit(0)
+
+    # Load existing listings from the configured store
+    store = open_store(LISTINGS_BACKEND, OUTPUT_JSON_FILE, LISTINGS_DB_FILE)
+    try:
+        with metrics.span('storage', 'load'):
+            existing_listings = store.load()
+    except Exception as e:
+        print(f"Error loading listings: {e}. Starting with empty listings.")
+        existing_listings = []
 
-    # Handle the --clear argument to delete Discord messages and clear the JSON file
+    # Handle the --clear argument to delete Discord messages and clear the stored listings
     if args.clear:
-        if os.path.exists(OUTPUT_JSON_FILE):
-            try:
-                # Load current listings to get message IDs before clearing
-                with open(OUTPUT_JSON_FILE, "r", encoding="utf-8") as f:
-                     # Load existing listings, handling potential empty file
-                    file_content = f.read()
-                    if file_content:
-                        listings_to_clear = json.loads(file_content)
-                    else:
-                        listings_to_clear = []
-
-                if listings_to_clear:
-                    print(f"Clearing {len(listings_to_clear)} messages...")
-                    notifier = DiscordNotifier(DISCORD_BOT_TOKEN, DISCORD_CHANNEL_ID)
-
-                    async def run_clear():
-                        await notifier.ensure_connected()
-                        deleted = await notifier.clear_messages(listings_to_clear)
-                        await notifier.close()
-                        return deleted
-
-                    # Run the async clear operation
-                    deleted_count = asyncio.run(run_clear())
-                    print(f"Successfully deleted {deleted_count} messages")
-
-                # After attempting to delete messages, empty the JSON file
-                with open(OUTPUT_JSON_FILE, "w", encoding="utf-8") as f:
-                    json.dump([], f, indent=2, ensure_ascii=False)
-                    print(f"Successfully emptied {OUTPUT_JSON_FILE}")
-
-            except Exception as e:
-                print(f"Error during clear operation: {e}")
-        else:
-            print(f"{OUTPUT_JSON_FILE} not found, no messages to clear.")
+        try:
+            if existing_listings:
+                print(f"Clearing {len(existing_listings)} messages...")
+                notifier = create_notifier()
+
+                async def run_clear():
+                    await notifier.ensure_connected()
+                    deleted = await notifier.clear_messages(existing_listings)
+                    await notifier.close()
+                    return deleted
+
+                # Run the async clear operation
+                deleted_count = asyncio.run(run_clear())
+                print(f"Successfully deleted {deleted_count} messages")
+            else:
+                print("No stored listings, no messages to clear.")
+
+            # After attempting to delete messages, empty the store and the JSON export
+            save_listings(store, [])
+        except Exception as e:
+            print(f"Error during clear operation: {e}")
         exit(0) # Exit after clear operation
 
+    # Handle daemon mode (keeps running until interrupted)
+    if args.daemon:
+        try:
+            asyncio.run(run_daemon(args, store, existing_listings))
+        except KeyboardInterrupt:
+            print("Daemon stopped")
+        finally:
+            store.close()
+        exit(0)
+
     # Handle debug mode (simulating removed listings)
     if args.debug:
         # In debug mode with --remove, we modify the existing listings directly
@@ -432,34 +545,49 @@ if __name__ == "__main__":
 
     # Normal scraping mode
     else:
-        active_scrapers = get_active_scrapers(args)
-        # Perform the actual scraping and comparison
-        all_listings, newly_found_listings, removed_listings, reactivated = scrape_all_sites(
+        scraper_keys = get_active_scrapers(args)
+        scheduler = None
+        if args.adaptive:
+            scheduler = AdaptiveScheduler()
+            scheduler.learn(existing_listings)
+            scraper_keys = get_due_scrapers(scheduler, scraper_keys)
+        active_scrapers = [get_scraper(name) for name in scraper_keys]
+        # Scrape, sending new listings to Discord as soon as each scraper finds them
+        all_listings, newly_found_listings, removed_listings, reactivated = asyncio.run(run_scrape(
             existing_listings, # Pass existing listings to the scraper functions
-            active_scrapers
-        )
-
-    # After scraping (or debug simulation), write the complete list of current listings to JSON
-    # This includes all active listings and any marked as inactive/removed in this run.
+            active_scrapers,
+            concurrency=args.concurrency,
+            timeout=args.timeout
+        ))
+        # Keep the stored listings of sites that weren't scraped this run
+        ran_sources = {scraper.source for scraper in active_scrapers}
+        all_listings = [l for l in existing_listings if l.get('source') not in ran_sources] + all_listings
+        if scheduler:
+            record_scheduled_runs(scheduler, active_scrapers, newly_found_listings, removed_listings, reactivated, all_listings)
+
+    # After scraping (or debug simulation), store the complete list of current listings
+    # This includes all active listings and inactive ones still within the retention window,
+    # and the message IDs assigned while sending notifications.
     if all_listings is not None: # Ensure all_listings is not None before writing
-        try:
-            with open(OUTPUT_JSON_FILE, "w", encoding="utf-8") as f:
-                json.dump(all_listings, f, indent=2, ensure_ascii=False)
-            print(f"Successfully wrote {len(all_listings)} listings to {OUTPUT_JSON_FILE}")
-        except Exception as e:
-            print(f"Error writing to {OUTPUT_JSON_FILE}: {e}")
+        all_listings = archive_expired_listings(all_listings)
+        save_listings(store, all_listings)
 
-    # Handle Discord notifications for changes detected
-    # Only run Discord operations if there are changes to report
-    if removed_listings or newly_found_listings or reactivated:
+    # In debug mode, handle Discord notifications for the simulated changes
+    if args.debug and (removed_listings or newly_found_listings or reactivated):
         try:
             # Run the asynchronous Discord operations
             asyncio.run(handle_discord_operations(
                 new_listings=newly_found_listings,
                 removed_listings=removed_listings,
-                reactivated_listings=reactivated
+                reactivated_listings=reactivated,
+                all_listings=all_listings
             ))
         except Exception as e:
             print(f"An error occurred during Discord operations: {e}")
 
-    # Note: The script finishes here. The workflow will then upload the updated listings.json.
+        # Persist the message IDs assigned while sending notifications
+        save_listings(store, all_listings)
+
+    store.close()
+    write_metrics()
+    # Note: The script finishes here. The workflow will then upload the updated listings files.
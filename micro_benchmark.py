@@ -0,0 +1,462 @@
+"""
+Micro-benchmarks of single pipeline stages, run offline on synthetic data or the
+HTTP fixtures recorded by `python benchmark.py --record`.
+
+    python micro_benchmark.py concurrency         # scrape_all_sites over sleeping stub scrapers
+    python micro_benchmark.py diff --size 20000   # ListingDiff against a 20k-listing history
+    python micro_benchmark.py dispatch --size 40  # send_notifications for 40 new listings
+    python micro_benchmark.py webhook             # send, edit and delete through the webhook backend
+    python micro_benchmark.py parsers             # Subo listings page with each HTML parser backend
+    python micro_benchmark.py details             # Dios detail pages, streaming extractor vs BeautifulSoup
+    python micro_benchmark.py memory              # 100k-listing history as Listing records vs dicts
+
+Each benchmark prints the median of --runs timed runs. benchmark.py measures the
+whole pipeline end to end; these isolate one stage so a change to it can be compared
+before and after without network, Discord or disk noise.
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import os
+import statistics
+import time
+import tracemalloc
+
+SOURCES = ('SuboScraper', 'DiosScraper')
+FIXTURES_DIR = os.path.join('fixtures', 'http')
+# bs4 tree builders compared by the parsers benchmark, when installed
+PARSER_BACKENDS = ('html.parser', 'lxml', 'html5lib')
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Offline micro-benchmarks of single pipeline stages')
+    parser.add_argument('benchmark', choices=list(BENCHMARKS), help='Stage to measure')
+    parser.add_argument('--runs', type=int, default=5, help='Number of timed runs')
+    parser.add_argument('--size', type=int, default=None, help='Number of listings (default per benchmark)')
+    parser.add_argument('--latency', type=float, default=0.05, help='Seconds per simulated Discord request')
+    parser.add_argument('--fixtures', default=FIXTURES_DIR, help='Fixture directory')
+    parser.add_argument('--html', nargs='+', default=None, help='Saved pages to parse instead of the fixtures')
+    parser.add_argument('--concurrency', type=int, default=4, help='Scrapers run in parallel by scrape_all_sites')
+    parser.add_argument('--timeout', type=float, default=1.0, help='Per-scraper timeout of scrape_all_sites')
+    return parser.parse_args()
+
+
+def median_time(func, runs, setup=None):
+    """Median seconds of func(setup()) over runs, with setup outside the timing"""
+    times = []
+    for _ in range(runs):
+        args = setup() if setup else ()
+        started = time.perf_counter()
+        func(*args)
+        times.append(time.perf_counter() - started)
+    return statistics.median(times)
+
+
+def peak_memory(func, *args):
+    """Peak bytes allocated by func(*args), traced separately from the timed runs"""
+    tracemalloc.start()
+    try:
+        func(*args)
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def retained_memory(build):
+    """(bytes still allocated once build() has returned, its result)"""
+    tracemalloc.start()
+    try:
+        result = build()
+        return tracemalloc.get_traced_memory()[0], result
+    finally:
+        tracemalloc.stop()
+
+
+def load_fixture_bodies(directory, url_prefix):
+    """Bodies of the recorded responses whose URL starts with url_prefix, by URL"""
+    bodies = {}
+    if not os.path.isdir(directory):
+        return bodies
+    for name in sorted(os.listdir(directory)):
+        if not name.endswith('.json'):
+            continue
+        path = os.path.join(directory, name[:-len('.json')])
+        with open(f"{path}.json", 'r', encoding='utf-8') as f:
+            meta = json.load(f)
+        if meta['url'].startswith(url_prefix) and meta['status'] == 200:
+            with open(f"{path}.body", 'rb') as f:
+                bodies[meta['url']] = f.read()
+    return bodies
+
+
+def load_pages(args, url_prefix):
+    """Pages given with --html, or else the matching fixtures; exits if there are none"""
+    if args.html:
+        pages = {}
+        for path in args.html:
+            with open(path, 'rb') as f:
+                pages[path] = f.read()
+        return pages
+    pages = load_fixture_bodies(args.fixtures, url_prefix)
+    if not pages:
+        raise SystemExit(f"No fixtures for {url_prefix} in {args.fixtures}, "
+                         f"run `python benchmark.py --record` or pass --html")
+    return pages
+
+
+def synthetic_listing(i, source=SOURCES[0], active=True):
+    return {
+        'address': f"Storgatan {i % 200 + 1}",
+        'url': f"https://example.se/{source.lower()}/lagenhet-{i}",
+        'price': f"{6000 + i % 4000}:-/månad",
+        'size': f"{30 + i % 90} kvm",
+        'rooms': f"{1 + i % 5} rum",
+        'available': 'Omgående',
+        'image_url': None,
+        'active': active,
+        'source': source,
+        'first_seen': '2024-01-01T12:00:00',
+    }
+
+
+def synthetic_history(size):
+    """Stored listings of every source; as in production, most are long inactive"""
+    listings = []
+    for i in range(size):
+        active = i % 20 == 0
+        listing = synthetic_listing(i, SOURCES[i % len(SOURCES)], active)
+        if not active:
+            listing['removed_at'] = '2024-02-01'
+        listings.append(listing)
+    return listings
+
+
+def bench_concurrency(args):
+    """
+    scrape_all_sites over stub scrapers that sleep instead of fetching, one of which
+    hangs past --timeout, against running them one after another
+    """
+    import main
+    from scrapers.base import RentalScraper
+
+    class SleepingScraper(RentalScraper):
+        def __init__(self, name, delay):
+            self.name = name
+            self.delay = delay
+
+        @property
+        def source(self):
+            return self.name
+
+        def iter_listings(self, existing_listings):
+            time.sleep(self.delay)
+            yield self.create_listing(address=f"{self.name} 1", url=f"https://example.se/{self.name}",
+                                      size='40 kvm', rooms='2 rum')
+
+    delays = [0.2, 0.4, 0.3, 0.5, 0.2, 0.3]
+    # The hung scraper is cut off at the timeout; its thread is left behind as a daemon
+    hang = args.timeout * 10
+    # Each scraper is held for its delay, or for the timeout if it hangs
+    held = delays + [args.timeout]
+    times = []
+    for _ in range(args.runs):
+        scrapers = [SleepingScraper(f"stub{i}", delay) for i, delay in enumerate(delays)]
+        scrapers.insert(1, SleepingScraper('hung', hang))
+        started = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            listings = main.scrape_all_sites([], scrapers, args.concurrency, args.timeout)[0]
+        times.append(time.perf_counter() - started)
+        if len(listings) != len(delays):
+            raise SystemExit(f"Expected {len(delays)} listings, got {len(listings)}")
+
+    print(f"{len(held)} scrapers ({len(delays)} sleeping {min(delays)}-{max(delays)}s, one hung), "
+          f"concurrency {args.concurrency}, timeout {args.timeout:g}s")
+    print(f"scrape_all_sites: {statistics.median(times):.2f}s")
+    print(f"one after another (sum): {sum(held):.2f}s, slowest scraper (max): {max(held):.2f}s")
+
+
+def bench_diff(args):
+    """ListingDiff (URL index, set operations) vs the old linear scan per scraped listing"""
+    from scrapers.base import ListingDiff
+
+    size = args.size or 10_000
+    source = SOURCES[0]
+    history = synthetic_history(size)
+    stored = [l for l in history if l['source'] == source]
+    # A scrape sees most currently active listings, some reactivated ones and a few new ones
+    scraped_urls = [l['url'] for l in stored if l['active']][10:]
+    scraped_urls += [l['url'] for l in stored if not l['active']][:20]
+    scraped_urls += [synthetic_listing(size + i, source)['url'] for i in range(30)]
+
+    def setup():
+        existing = [dict(l) for l in history]
+        scraped = [dict(synthetic_listing(0, source), url=url) for url in scraped_urls]
+        return existing, scraped
+
+    def indexed(existing, scraped):
+        diff = ListingDiff(source, existing, reactivate_inactive=True)
+        for listing in scraped:
+            diff.add(listing)
+        return diff.finish()
+
+    def linear(existing, scraped):
+        # What the scrapers did before ListingDiff: a scan of the history per listing, then per removal
+        for listing in scraped:
+            next((l for l in existing if l['url'] == listing['url']), None)
+        scraped_set = {l['url'] for l in scraped}
+        return [l for l in existing if l.get('source') == source and l['url'] not in scraped_set]
+
+    _, new, removed, reactivated = indexed(*setup())
+    print(f"{size} stored listings, {len(scraped_urls)} scraped: "
+          f"{len(new)} new, {len(removed)} removed, {len(reactivated)} reactivated")
+    indexed_time = median_time(indexed, args.runs, setup)
+    linear_time = median_time(linear, args.runs, setup)
+    print(f"ListingDiff: {indexed_time * 1000:.2f}ms")
+    print(f"linear scan: {linear_time * 1000:.2f}ms ({linear_time / indexed_time:.0f}x slower)")
+
+
+def slow_channel(latency):
+    """FakeChannel whose sends, edits and deletes each take latency seconds, like a Discord request"""
+    from fake_discord import FakeChannel, FakeMessage
+
+    class SlowMessage(FakeMessage):
+        async def edit(self, embeds):
+            await asyncio.sleep(latency)
+            await super().edit(embeds)
+
+        async def delete(self):
+            await asyncio.sleep(latency)
+            await super().delete()
+
+    class SlowChannel(FakeChannel):
+        async def send(self, embeds):
+            await asyncio.sleep(latency)
+            message = await super().send(embeds)
+            return SlowMessage(self, message.id)
+
+        def get_partial_message(self, message_id):
+            return SlowMessage(self, message_id)
+
+    return SlowChannel()
+
+
+def check_message_mapping(listings, log):
+    # Every listing must be mapped back to its message and embed, or it can't be edited later
+    sent = {entry['message_id']: entry['titles'] for entry in log if entry['action'] == 'send'}
+    for listing in listings:
+        titles = sent.get(listing.get('message_id'))
+        if titles is None or len(titles) != listing['embed_count'] or listing['embed_index'] >= len(titles):
+            raise SystemExit(f"{listing['url']} was not mapped to the message it was sent in")
+    return sent
+
+
+def bench_dispatch(args):
+    """send_notifications on FakeNotifier, each Discord request delayed by --latency"""
+    from fake_discord import FakeNotifier
+    from utils import MAX_EMBEDS_PER_MESSAGE
+
+    size = args.size or 40
+    times = []
+    for _ in range(args.runs):
+        notifier = FakeNotifier(log_path=None)
+        notifier.channel = slow_channel(args.latency)
+        listings = [synthetic_listing(i) for i in range(size)]
+        started = time.perf_counter()
+        asyncio.run(notifier.send_notifications(listings))
+        times.append(time.perf_counter() - started)
+        sent = check_message_mapping(listings, notifier.channel.log)
+
+    dispatch_time = statistics.median(times)
+    # Before batching: one message per listing plus a fixed asyncio.sleep(1) after each
+    unbatched_time = size * (args.latency + 1)
+    print(f"{size} new listings, {len(sent)} messages of up to {MAX_EMBEDS_PER_MESSAGE} embeds, "
+          f"{args.latency * 1000:.0f}ms per request")
+    print(f"send_notifications: {dispatch_time:.3f}s")
+    print(f"one message per listing with fixed sleeps: {unbatched_time:.1f}s")
+
+
+def bench_webhook(args):
+    """
+    WebhookNotifier against FakeWebhookServer, a local HTTP server for the webhook
+    endpoints: send, edit on removal and clear through discord.Webhook and the
+    WebhookChannel / WebhookMessageHandle adapters, each request delayed by --latency
+    """
+    from fake_discord import FakeWebhookServer
+    from notifiers import WebhookNotifier
+
+    size = args.size or 25
+    times = {'send': [], 'edit': [], 'delete': []}
+
+    async def run(listings):
+        async with FakeWebhookServer(args.latency) as server:
+            # Without a channel ID the notifier fetches the webhook to look it up
+            notifier = WebhookNotifier(server.webhook_url)
+            try:
+                started = time.perf_counter()
+                await notifier.send_notifications(listings)
+                times['send'].append(time.perf_counter() - started)
+                if notifier.channel_id != server.CHANNEL_ID:
+                    raise SystemExit(f"Webhook channel {notifier.channel_id} not looked up")
+                # clear_messages drops the message IDs from the listings, so check them now
+                sent = set(check_message_mapping(listings, server.log))
+
+                removed = listings[::3]
+                for listing in removed:
+                    listing['active'] = False
+                    listing['removed_at'] = '2024-03-01'
+                started = time.perf_counter()
+                await notifier.update_listing_messages(removed, listings)
+                times['edit'].append(time.perf_counter() - started)
+                edits_expected = {listing['message_id'] for listing in removed}
+
+                started = time.perf_counter()
+                await notifier.clear_messages(listings)
+                times['delete'].append(time.perf_counter() - started)
+            finally:
+                await notifier.close()
+        return server, sent, edits_expected
+
+    for _ in range(args.runs):
+        listings = [synthetic_listing(i) for i in range(size)]
+        with contextlib.redirect_stdout(io.StringIO()):
+            server, sent, edits_expected = asyncio.run(run(listings))
+
+        edited = {entry['message_id'] for entry in server.log if entry['action'] == 'edit'}
+        deleted = {entry['message_id'] for entry in server.log if entry['action'] == 'delete'}
+        if edited != edits_expected or deleted != sent or server.messages:
+            raise SystemExit(f"Webhook messages not edited or deleted as expected: {len(sent)} sent, "
+                             f"{len(edited)} of {len(edits_expected)} edited, {len(deleted)} deleted")
+
+    print(f"{size} listings in {len(sent)} webhook messages over local HTTP, {args.latency * 1000:.0f}ms per request")
+    for phase, phase_times in times.items():
+        print(f"{phase}: {statistics.median(phase_times):.3f}s")
+
+
+def bench_parsers(args):
+    """SuboScraper.parse_listings on saved listings pages with each installed bs4 backend"""
+    from scrapers.parsing import make_soup
+    from scrapers.subo import SuboScraper
+
+    scraper = SuboScraper()
+    pages = list(load_pages(args, scraper.url).values())
+    print(f"{len(pages)} pages, {sum(len(page) for page in pages) / 1024:.0f}KB")
+
+    def parse_all(parser):
+        return sum(len(scraper.parse_listings(page, parser=parser)) for page in pages)
+
+    def full_tree(parser):
+        # The whole page as a tree, as before parsing was limited to the listing grid items
+        for page in pages:
+            make_soup(page, parser=parser)
+
+    counts = {}
+    for backend in PARSER_BACKENDS:
+        try:
+            counts[backend] = parse_all(backend)
+        except Exception as e:
+            # bs4 raises FeatureNotFound for a tree builder that isn't installed
+            print(f"{backend}: skipped ({e.__class__.__name__})")
+            continue
+        parse_time = median_time(parse_all, args.runs, lambda: (backend,))
+        full_time = median_time(full_tree, args.runs, lambda: (backend,))
+        print(f"{backend}: {parse_time * 1000:.1f}ms, peak {peak_memory(parse_all, backend) / 1024:.0f}KB, "
+              f"{counts[backend]} listings (full tree {full_time * 1000:.1f}ms, "
+              f"peak {peak_memory(full_tree, backend) / 1024:.0f}KB)")
+
+    if len(set(counts.values())) > 1:
+        raise SystemExit(f"Backends found different numbers of listings: {counts}")
+
+
+def soup_listing_details(html):
+    """The BeautifulSoup detail page parsing extract_listing_facts replaced, without the request"""
+    from bs4 import BeautifulSoup
+
+    soup = BeautifulSoup(html, 'html.parser')
+    details = {}
+    size_number = soup.find('span', class_='object-factshighlightnumber')
+    size_unit = size_number.find_next_sibling('span', class_='object-factshighlightunit') if size_number else None
+    if size_number and size_unit:
+        details['size'] = f"{size_number.text.strip()} {size_unit.text.strip()}"
+    numbers = soup.find_all('span', class_='object-factshighlightnumber')
+    rooms_number = numbers[1] if len(numbers) > 1 else None
+    rooms_unit = rooms_number.find_next_sibling('span', class_='object-factshighlightunit') if rooms_number else None
+    if rooms_number and rooms_unit:
+        details['rooms'] = f"{rooms_number.text.strip()} {rooms_unit.text.strip()}"
+    available_title = soup.find('dt', class_='object-factshighlightdetailtitle', string='Tillträde')
+    if available_title:
+        available_value = available_title.find_next_sibling('dd', class_='object-factshighlightdetailvalue')
+        if available_value:
+            details['available'] = available_value.text.strip()
+    return details
+
+
+def bench_details(args):
+    """extract_listing_facts vs the old BeautifulSoup parsing on recorded Dios detail pages"""
+    from scrapers.dios import DiosScraper, extract_listing_facts
+
+    scraper = DiosScraper()
+    pages = load_pages(args, scraper.base_url)
+    # Everything recorded from dios.se except the JSON listings API
+    pages = [page.decode('utf-8', errors='replace') for url, page in pages.items() if url != scraper.url]
+    if not pages:
+        raise SystemExit(f"No Dios detail pages in {args.fixtures}")
+
+    for page in pages:
+        if extract_listing_facts(page) != soup_listing_details(page):
+            raise SystemExit(f"Parsers disagree: {extract_listing_facts(page)} vs {soup_listing_details(page)}")
+
+    def parse_all(parse):
+        for page in pages:
+            parse(page)
+
+    print(f"{len(pages)} detail pages, {sum(len(page) for page in pages) / len(pages) / 1024:.0f}KB on average")
+    for name, parse in (('extract_listing_facts', extract_listing_facts), ('BeautifulSoup', soup_listing_details)):
+        per_page = median_time(parse_all, args.runs, lambda: (parse,)) / len(pages)
+        print(f"{name}: {per_page * 1000:.2f}ms per page, peak {peak_memory(parse_all, parse) / 1024:.0f}KB")
+
+
+def bench_memory(args):
+    """Memory of a loaded listing history as Listing records vs plain dicts, and (de)serialization time"""
+    from scrapers.listing import Listing
+
+    size = args.size or 100_000
+    history = synthetic_history(size)
+    for i, listing in enumerate(history):
+        # Notified listings carry their message fields, as in listings.json
+        listing.update(message_id=10**18 + i, channel_id=10**17, embed_index=0, embed_count=1,
+                       notified_at='2024-01-01', rent=6000 + i % 4000, area=30 + i % 90, room_count=1 + i % 5)
+    # Loaded from JSON like storage.py, so strings aren't shared between records as they were when generated
+    text = json.dumps(history, ensure_ascii=False)
+    del history
+
+    dict_bytes, dicts = retained_memory(lambda: json.loads(text))
+    del dicts
+    listing_bytes, listings = retained_memory(lambda: [Listing.from_dict(data) for data in json.loads(text)])
+
+    load_time = median_time(lambda: [Listing.from_dict(data) for data in json.loads(text)], args.runs)
+    dict_load_time = median_time(lambda: json.loads(text), args.runs)
+    dump_time = median_time(lambda: json.dumps([listing.to_dict() for listing in listings], ensure_ascii=False),
+                            args.runs)
+    print(f"{size} listings, {len(text) / 1024 ** 2:.1f}MB as JSON")
+    print(f"dicts: {dict_bytes / 1024 ** 2:.1f}MB ({dict_bytes / size:.0f} bytes each), "
+          f"loaded in {dict_load_time * 1000:.0f}ms")
+    print(f"Listing: {listing_bytes / 1024 ** 2:.1f}MB ({listing_bytes / size:.0f} bytes each), "
+          f"loaded in {load_time * 1000:.0f}ms, saved in {dump_time * 1000:.0f}ms")
+
+
+BENCHMARKS = {
+    'concurrency': bench_concurrency,
+    'diff': bench_diff,
+    'dispatch': bench_dispatch,
+    'webhook': bench_webhook,
+    'parsers': bench_parsers,
+    'details': bench_details,
+    'memory': bench_memory,
+}
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    BENCHMARKS[args.benchmark](args)
@@ -0,0 +1,381 @@
+import asyncio
+from datetime import datetime, timedelta
+
+import aiohttp
+import discord
+from discord import Embed
+
+from config import NOTIFIER_BACKEND, SUBSCRIPTIONS_FILE, discord_credentials
+from utils import format_notification_title, MAX_EMBEDS_PER_MESSAGE
+from subscriptions import SubscriptionIndex, load_subscriptions
+from scrapers.base import MESSAGE_KEYS
+from scrapers.metrics import metrics
+
+
+class DiscordNotifier:
+    def __init__(self, token, channel_id, subscriptions=None):
+        self.token = token
+        self.channel_id = channel_id
+        # SubscriptionIndex routing matching listings to extra channels or DMs
+        self.subscriptions = subscriptions
+        self._destinations = {}
+        intents = discord.Intents.default()
+        # Enable the message_content intent if needed for fetching messages
+        # intents.message_content = True
+        self.client = discord.Client(intents=intents)
+        self._ready = asyncio.Event()
+        self.channel = None
+
+        @self.client.event
+        async def on_ready():
+            self.channel = self.client.get_channel(self.channel_id)
+            self._ready.set()
+
+    async def connect(self):
+        try:
+            # Use run instead of start to keep the bot running for async operations
+            await self.client.start(self.token)
+        except Exception as e:
+            print(f"Failed to connect to Discord: {e}")
+            raise
+
+    async def ensure_connected(self):
+        # Check if the client is already connected and ready
+        if not self.client.is_ready():
+             # If not ready, start the client in a separate task
+            connect_task = asyncio.create_task(self.client.start(self.token))
+            try:
+                # Wait for the on_ready event to be set
+                with metrics.span('discord', 'connect'):
+                    await asyncio.wait_for(self._ready.wait(), timeout=30)
+            except asyncio.TimeoutError:
+                # If timeout occurs, cancel the connection task and raise an error
+                connect_task.cancel()
+                raise TimeoutError("Failed to connect to Discord within 30 seconds")
+
+        # Ensure the channel object is available
+        if not self.channel:
+            self.channel = self.client.get_channel(self.channel_id)
+            if not self.channel:
+                raise ValueError(f"Could not find channel with ID {self.channel_id}")
+
+
+    def build_embed(self, listing):
+        # Title formatting with proper emoji spacing for strikethrough
+        # Keep the date of the original notification when re-rendering an existing message
+        if not listing.get('notified_at'):
+            # Older listings only have the message ID, which encodes when it was sent
+            sent_at = discord.utils.snowflake_time(listing['message_id']) if listing.get('message_id') else datetime.now()
+            listing['notified_at'] = sent_at.strftime('%Y-%m-%d')
+        title = format_notification_title(listing['url'], listing['notified_at'])
+        # Apply strikethrough only if the listing is marked as inactive
+        if not listing.get('active', True):
+            # Split emoji and text to prevent emoji from being struck through
+            parts = title.split(' ', 1)
+            # Reconstruct title with strikethrough on the text part
+            title = f"{parts[0]} ~~{parts[1]}~~"
+
+        # Create the embed message
+        embed = Embed(
+            title=title,
+            # Set URL only if the listing is active
+            url=listing['url'] if listing.get('active', True) else None,
+            # Set color based on active status
+            color=discord.Color.green() if listing.get('active', True) else discord.Color.red()
+        )
+
+        # Define formatting for field values and names (with conditional strikethrough)
+        value_format = "```{}```" # Use code block for values
+        name_format = "{}" if listing.get('active', True) else "~~{}~~" # Apply strikethrough to names if inactive
+
+        # Determine the text for the 'Ledigt' field
+        available_text = listing.get('available', 'N/A') # Use .get for safety
+        # If inactive, show removal date instead of availability
+        if not listing.get('active', True):
+            # Use the 'removed_at' field if available, otherwise use current date
+            removal_date = listing.get('removed_at', datetime.now().strftime('%Y-%m-%d'))
+            available_text = f"Borttagen {removal_date}"
+
+        # Add fields to the embed
+        embed.add_field(name=name_format.format("Adress"), value=value_format.format(listing.get('address', 'N/A')), inline=False)
+        embed.add_field(name=name_format.format("Rum"), value=value_format.format(listing.get('rooms', 'N/A')), inline=True)
+        embed.add_field(name=name_format.format("Storlek"), value=value_format.format(listing.get('size', 'N/A')), inline=True)
+        embed.add_field(name=name_format.format("Hyra"), value=value_format.format(listing.get('price', 'N/A')), inline=True)
+        embed.add_field(name=name_format.format("Ledigt"), value=value_format.format(available_text), inline=False)
+
+        # Handle image if URL is provided
+        if listing.get('image_url'):
+            embed.set_image(url=listing.get('image_url'))
+
+        return embed
+
+    async def send_notifications(self, listings):
+        # Ensure the bot is connected before sending
+        await self.ensure_connected()
+
+        messages = []
+        # Pack up to MAX_EMBEDS_PER_MESSAGE listings into each message. No fixed sleeps are
+        # needed between sends: discord.py reads the X-RateLimit headers on every response
+        # and waits for the bucket to reset before sending the next request.
+        for start in range(0, len(listings), MAX_EMBEDS_PER_MESSAGE):
+            batch = listings[start:start + MAX_EMBEDS_PER_MESSAGE]
+            try:
+                # Send the embeds to the channel in one message
+                with metrics.span('discord', 'send'):
+                    msg = await self.channel.send(embeds=[self.build_embed(listing) for listing in batch])
+            except Exception as e:
+                addresses = ', '.join(listing.get('address', 'Unknown') for listing in batch)
+                print(f"Error sending message for {addresses}: {e}")
+                continue
+
+            # Store the message ID, channel ID and embed position in the listing data
+            # so the message can be rebuilt and edited later without fetching it
+            for index, listing in enumerate(batch):
+                listing['message_id'] = msg.id
+                listing['channel_id'] = self.channel_id
+                listing['embed_index'] = index
+                listing['embed_count'] = len(batch)
+            messages.append(msg)
+        return messages
+
+    async def get_destination(self, subscription):
+        # Channel or user (DM) a subscription's alerts are sent to
+        if subscription.get('channel_id'):
+            channel_id = int(subscription['channel_id'])
+            return self.client.get_channel(channel_id) or await self.client.fetch_channel(channel_id)
+        if subscription.get('user_id'):
+            # Users can be sent messages directly; discord.py opens the DM channel
+            return await self.client.fetch_user(int(subscription['user_id']))
+        return None
+
+    async def send_subscription_alerts(self, listings):
+        """
+        Send listings to every subscription whose filters they match, one message
+        per target for up to MAX_EMBEDS_PER_MESSAGE listings. The main channel message
+        stays the one that is edited on removal; these alerts are sent once.
+        """
+        if not self.subscriptions:
+            return 0
+        await self.ensure_connected()
+
+        # Group by target so a listing matching several subscriptions of one user is sent once
+        matched_by_target = {}
+        for listing in listings:
+            for subscription in self.subscriptions.match(listing):
+                target = (subscription.get('channel_id'), subscription.get('user_id'), subscription.get('webhook_url'))
+                matched = matched_by_target.setdefault(target, (subscription, {}))[1]
+                matched[listing['url']] = listing
+
+        sent = 0
+        for target, (subscription, matched) in matched_by_target.items():
+            name = subscription.get('id', target)
+            try:
+                if target not in self._destinations:
+                    self._destinations[target] = await self.get_destination(subscription)
+                destination = self._destinations[target]
+                if destination is None:
+                    print(f"Subscription {name} has no target supported by the {NOTIFIER_BACKEND} backend, skipping")
+                    continue
+                batch_listings = list(matched.values())
+                for start in range(0, len(batch_listings), MAX_EMBEDS_PER_MESSAGE):
+                    batch = batch_listings[start:start + MAX_EMBEDS_PER_MESSAGE]
+                    with metrics.span('discord', 'send_subscription'):
+                        await destination.send(embeds=[self.build_embed(listing) for listing in batch])
+                    sent += len(batch)
+                print(f"Sent {len(matched)} listings to subscription {name}")
+            except Exception as e:
+                print(f"Error sending alerts for subscription {name}: {e}")
+        return sent
+
+    async def update_listing_messages(self, listings, all_listings=None):
+        """
+        Re-render the Discord messages of changed listings from the listing data and
+        edit them by ID, without fetching them first. all_listings is used to rebuild
+        the other embeds of messages that hold several listings.
+        """
+        await self.ensure_connected()
+
+        # Map message ID -> {embed_index: listing} for every listing we know about
+        slots_by_message = {}
+        for listing in list(all_listings or []) + list(listings):
+            if listing.get('message_id'):
+                slots = slots_by_message.setdefault(listing['message_id'], {})
+                slot = slots.get(listing.get('embed_index', 0))
+                # Duplicates share a slot; show an active one if any is still listed
+                if slot is None or listing.get('active', True) or not slot.get('active', True):
+                    slots[listing.get('embed_index', 0)] = listing
+
+        updated = 0
+        changed_by_message = {}
+        for listing in listings:
+            if not listing.get('message_id'):
+                print(f"Skipping update for listing with no message_id: {listing.get('address', 'Unknown')}")
+                continue
+            changed_by_message.setdefault(listing['message_id'], []).append(listing)
+
+        for message_id, changed in changed_by_message.items():
+            addresses = ', '.join(listing.get('address', 'Unknown') for listing in changed)
+            slots = slots_by_message[message_id]
+            embed_count = changed[0].get('embed_count', 1)
+            try:
+                if sorted(slots) == list(range(embed_count)):
+                    # Every listing in the message is known, so build all embeds locally
+                    message = self.channel.get_partial_message(message_id)
+                    embeds = [self.build_embed(slots[index]) for index in range(embed_count)]
+                else:
+                    # Some listings sharing this message are no longer stored; keep their embeds as they are
+                    with metrics.span('discord', 'fetch_message'):
+                        message = await self.channel.fetch_message(message_id)
+                    embeds = message.embeds
+                    for listing in changed:
+                        embeds[listing.get('embed_index', 0)] = self.build_embed(listing)
+
+                with metrics.span('discord', 'edit'):
+                    await message.edit(embeds=embeds)
+                updated += len(changed)
+                print(f"Successfully updated listing message for: {addresses}")
+            except discord.errors.NotFound:
+                print(f"Message with ID {message_id} not found for listing: {addresses}")
+            except Exception as e:
+                print(f"Error updating listing message for {addresses}: {e}")
+        return updated
+
+    async def clear_messages(self, listings):
+        await self.ensure_connected()
+        deleted_count = 0
+
+        # Collect all unique message IDs first (a message can hold several listings)
+        message_ids = list(dict.fromkeys(listing['message_id'] for listing in listings if listing.get('message_id')))
+        print(f"Found {len(message_ids)} message IDs to delete")
+
+        # Discord only bulk deletes messages younger than 14 days
+        bulk_cutoff = discord.utils.utcnow() - timedelta(days=14)
+        recent = [msg_id for msg_id in message_ids if discord.utils.snowflake_time(msg_id) > bulk_cutoff]
+        recent_ids = set(recent)
+        old = [msg_id for msg_id in message_ids if msg_id not in recent_ids]
+
+        for start in range(0, len(recent), 100):
+            chunk = recent[start:start + 100]
+            try:
+                with metrics.span('discord', 'bulk_delete'):
+                    await self.channel.delete_messages([discord.Object(id=msg_id) for msg_id in chunk])
+                deleted_count += len(chunk)
+                print(f"Bulk deleted {len(chunk)} messages")
+            except Exception as e:
+                # e.g. missing Manage Messages permission; delete them one by one instead
+                print(f"Bulk delete failed ({e}), deleting messages individually")
+                old.extend(chunk)
+
+        for msg_id in old:
+            try:
+                # Delete by ID without fetching the message first
+                with metrics.span('discord', 'delete'):
+                    await self.channel.get_partial_message(msg_id).delete()
+                deleted_count += 1
+                print(f"Deleted message ID {msg_id}")
+            except discord.errors.NotFound:
+                print(f"Message with ID {msg_id} not found for deletion (already deleted?)")
+            except Exception as e:
+                print(f"Failed to delete message with ID {msg_id}: {e}")
+
+        # Clear message IDs from listings data in memory
+        for listing in listings:
+            for key in MESSAGE_KEYS:
+                listing.pop(key, None)
+
+        # Write updated listings (without message IDs) back to storage
+        # This happens in the main execution block after the clear operation completes.
+        return deleted_count
+
+    async def close(self):
+        # Close the Discord client connection
+        if self.client and not self.client.is_closed():
+            await self.client.close()
+
+class WebhookChannel:
+    """Adapter giving a discord.Webhook the channel methods DiscordNotifier uses"""
+
+    def __init__(self, webhook):
+        self.webhook = webhook
+
+    async def send(self, embeds):
+        # wait=True makes Discord return the created message so its ID can be stored
+        return await self.webhook.send(embeds=embeds, wait=True)
+
+    def get_partial_message(self, message_id):
+        return WebhookMessageHandle(self.webhook, message_id)
+
+    async def fetch_message(self, message_id):
+        return await self.webhook.fetch_message(message_id)
+
+    async def delete_messages(self, messages):
+        # Webhooks have no bulk delete endpoint
+        for message in messages:
+            await self.webhook.delete_message(message.id)
+
+
+class WebhookMessageHandle:
+    """Edit or delete a webhook message by ID without fetching it"""
+
+    def __init__(self, webhook, message_id):
+        self.webhook = webhook
+        self.id = message_id
+
+    async def edit(self, embeds):
+        return await self.webhook.edit_message(self.id, embeds=embeds)
+
+    async def delete(self):
+        await self.webhook.delete_message(self.id)
+
+
+class WebhookNotifier(DiscordNotifier):
+    """
+    Sends, edits and deletes listing messages through a channel webhook over
+    plain HTTP, skipping the gateway login. Uses the same embeds as DiscordNotifier.
+    Only messages sent by the webhook itself can be edited or deleted.
+    """
+
+    def __init__(self, webhook_url, channel_id=None, subscriptions=None):
+        self.webhook_url = webhook_url
+        self.channel_id = channel_id
+        self.subscriptions = subscriptions
+        self._destinations = {}
+        self.session = None
+        self.channel = None
+
+    async def ensure_connected(self):
+        if self.channel:
+            return
+        # One pooled HTTP session for all webhook requests
+        self.session = aiohttp.ClientSession()
+        webhook = discord.Webhook.from_url(self.webhook_url, session=self.session)
+        if not self.channel_id:
+            # Look up the webhook's channel so it can be stored with each listing
+            with metrics.span('discord', 'connect'):
+                webhook = await webhook.fetch()
+            self.channel_id = webhook.channel_id
+        self.channel = WebhookChannel(webhook)
+
+    async def get_destination(self, subscription):
+        # Without a bot login, subscriptions can only be routed to their own webhooks
+        if subscription.get('webhook_url'):
+            return WebhookChannel(discord.Webhook.from_url(subscription['webhook_url'], session=self.session))
+        return None
+
+    async def close(self):
+        if self.session and not self.session.closed:
+            await self.session.close()
+
+
+def create_notifier():
+    # Pick the notifier backend selected by NOTIFIER_BACKEND
+    token, channel_id, webhook_url = discord_credentials()
+    subscriptions = load_subscriptions(SUBSCRIPTIONS_FILE)
+    # Compile the filters once; matching a listing then uses the index instead of every filter
+    index = SubscriptionIndex(subscriptions) if subscriptions else None
+    if NOTIFIER_BACKEND == 'webhook':
+        return WebhookNotifier(webhook_url, channel_id, subscriptions=index)
+    if NOTIFIER_BACKEND == 'fake':
+        from fake_discord import FakeNotifier
+        return FakeNotifier(channel_id, subscriptions=index)
+    return DiscordNotifier(token, channel_id, subscriptions=index)
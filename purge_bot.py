@@ -1,8 +1,10 @@
 import discord
 from discord.ext import commands
-from config import DISCORD_BOT_TOKEN, DISCORD_CHANNEL_ID
+from config import discord_credentials
+
+# The purge bot always logs in, whatever NOTIFIER_BACKEND is set to
+DISCORD_BOT_TOKEN, DISCORD_CHANNEL_ID, _ = discord_credentials('gateway')
 
-# Use the token from config
 intents = discord.Intents.default()
 intents.message_content = True
 intents.members = True
@@ -48,4 +50,5 @@ async def purge_error(ctx, error):
     elif isinstance(error, commands.MissingRequiredArgument):
         await ctx.send("❌ Usage: `!purge <number|all>`")
 
-bot.run(DISCORD_BOT_TOKEN)
+if __name__ == "__main__":
+    bot.run(DISCORD_BOT_TOKEN)
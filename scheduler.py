@@ -0,0 +1,141 @@
+import json
+import os
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+
+from config import (SCHEDULER_MIN_INTERVAL, SCHEDULER_MAX_INTERVAL, SCHEDULER_TARGET_EVENTS,
+                    SCHEDULER_HISTORY_DAYS, SCHEDULER_BACKOFF, SCHEDULE_STATE_FILE)
+
+HOURS_PER_WEEK = 7 * 24
+# Discord snowflakes count milliseconds from 2015-01-01 UTC in their upper bits
+DISCORD_EPOCH_MS = 1420070400000
+# Consecutive idle runs after which the backoff stops growing
+MAX_IDLE_RUNS = 10
+
+
+def _parse_time(value) -> Optional[datetime]:
+    try:
+        return datetime.fromisoformat(value) if value else None
+    except (TypeError, ValueError):
+        return None
+
+
+def listing_events(listing: Dict) -> List[datetime]:
+    """Times of a stored listing's new, removed and reactivated events"""
+    events = []
+    first_seen = _parse_time(listing.get('first_seen'))
+    if first_seen is None and listing.get('message_id') and not listing.get('duplicate_of'):
+        # Listings stored before first_seen was added: use the time of their notification
+        first_seen = datetime.fromtimestamp(((int(listing['message_id']) >> 22) + DISCORD_EPOCH_MS) / 1000)
+    if first_seen:
+        events.append(first_seen)
+    # last_updated is set when a listing is removed or reactivated
+    last_updated = _parse_time(listing.get('last_updated'))
+    if last_updated:
+        events.append(last_updated)
+    return events
+
+
+def _hour_of_week(moment: datetime) -> int:
+    return moment.weekday() * 24 + moment.hour
+
+
+class AdaptiveScheduler:
+    """
+    Poll interval per source, learned from when its listings were added, removed
+    and reactivated. The event rate for each hour of the week sets the interval so
+    a poll finds about target_events changes: short during publish windows, up to
+    max_interval when nothing happens. Runs that find no changes back the interval
+    off further. Last runs are kept in a state file so one-shot runs can skip
+    sources that aren't due yet.
+    """
+
+    def __init__(self, min_interval=SCHEDULER_MIN_INTERVAL, max_interval=SCHEDULER_MAX_INTERVAL,
+                 target_events=SCHEDULER_TARGET_EVENTS, history_days=SCHEDULER_HISTORY_DAYS,
+                 backoff=SCHEDULER_BACKOFF, state_path=SCHEDULE_STATE_FILE):
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.target_events = target_events
+        self.history_days = history_days
+        self.backoff = backoff
+        self.state_path = state_path
+        # source -> events per hour for each hour of the week
+        self.rates = {}
+        self.state = self._load_state()
+
+    def _load_state(self) -> Dict:
+        try:
+            with open(self.state_path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def save(self):
+        tmp_path = f"{self.state_path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.state, f, indent=2)
+        os.replace(tmp_path, self.state_path)
+
+    def learn(self, listings: List[Dict], now: datetime = None):
+        """Rebuild the per-hour event rates from the stored listings"""
+        now = now or datetime.now()
+        cutoff = now - timedelta(days=self.history_days)
+        counts = {}
+        earliest = {}
+        for listing in listings:
+            source = listing.get('source')
+            for event in listing_events(listing):
+                if cutoff <= event <= now:
+                    counts.setdefault(source, [0] * HOURS_PER_WEEK)[_hour_of_week(event)] += 1
+                    earliest[source] = min(earliest.get(source, event), event)
+
+        self.rates = {}
+        for source, hours in counts.items():
+            # Average over the weeks of history actually observed (at least one day's worth)
+            weeks = max((now - earliest[source]).total_seconds() / (7 * 24 * 3600), 1 / 7)
+            # Spread each hour's count over its neighbours, since publishing isn't exactly on the hour
+            self.rates[source] = [
+                (hours[h] + 0.5 * (hours[h - 1] + hours[(h + 1) % HOURS_PER_WEEK])) / (2 * weeks)
+                for h in range(HOURS_PER_WEEK)
+            ]
+
+    def _clamp(self, seconds: float) -> float:
+        return max(self.min_interval, min(self.max_interval, seconds))
+
+    def _desired(self, source: str, moment: datetime) -> float:
+        rate = self.rates.get(source, [0.0] * HOURS_PER_WEEK)[_hour_of_week(moment)]
+        if rate <= 0:
+            return self.max_interval
+        return self._clamp(self.target_events * 3600 / rate)
+
+    def interval(self, source: str, now: datetime = None) -> float:
+        """Seconds until the source should be polled again"""
+        now = now or datetime.now()
+        idle_runs = self.state.get(source, {}).get('idle_runs', 0)
+        best = self._clamp(self._desired(source, now) * self.backoff ** idle_runs)
+        # Wake up in time for a busier hour that starts before then
+        hour_start = now.replace(minute=0, second=0, microsecond=0)
+        for hours in range(1, int(self.max_interval // 3600) + 2):
+            start = hour_start + timedelta(hours=hours)
+            wait = (start - now).total_seconds()
+            if wait >= best:
+                break
+            best = min(best, wait + self._desired(source, start))
+        return self._clamp(best)
+
+    def next_run(self, source: str) -> Optional[datetime]:
+        last_run = _parse_time(self.state.get(source, {}).get('last_run'))
+        if last_run is None:
+            return None
+        return last_run + timedelta(seconds=self.interval(source, last_run))
+
+    def is_due(self, source: str, now: datetime = None, slack: float = 0) -> bool:
+        """Whether the source's interval has passed, within slack seconds"""
+        next_run = self.next_run(source)
+        now = now or datetime.now()
+        return next_run is None or now + timedelta(seconds=slack) >= next_run
+
+    def record_run(self, source: str, changed: bool, now: datetime = None):
+        state = self.state.setdefault(source, {})
+        state['last_run'] = (now or datetime.now()).isoformat()
+        state['idle_runs'] = 0 if changed else min(state.get('idle_runs', 0) + 1, MAX_IDLE_RUNS)
@@ -1,26 +1,241 @@
-from abc import ABC, abstractmethod
-from typing import List, Tuple, Dict, Any
+import threading
+import time
+from abc import ABC
+from typing import List, Tuple, Dict, Iterator, Optional, Callable, Union
 from datetime import datetime
 
+from .listing import Listing
+from .metrics import metrics
+from .normalize import normalize_listing
+
+# Listing fields that tie a listing to its Discord message and must survive a re-scrape
+# (duplicate_of is the URL of the listing whose message a duplicate shares)
+MESSAGE_KEYS = ['message_id', 'channel_id', 'embed_index', 'embed_count', 'notified_at', 'duplicate_of']
+
+
+class SeenUrl(str):
+    """URL that is still listed on the site but didn't produce a complete listing"""
+
+
+class SourceUnchanged(Exception):
+    """Raised by iter_listings when the source hasn't changed since the last run"""
+
+
+class ListingDiff:
+    """
+    Incremental diff of scraped listings against the stored listings of one source.
+    Listings are classified as they are added; removals are computed in finish().
+    """
+
+    def __init__(self, source: str, existing_listings: List[Dict], reactivate_inactive: bool = False):
+        self.reactivate_inactive = reactivate_inactive
+        # Build the URL index once per run instead of scanning existing_listings per item
+        self.index = {l['url']: l for l in existing_listings if l.get('source') == source}
+        self.seen_urls = set()
+        # URLs that produced a complete listing (whether or not it was kept)
+        self.listed_urls = set()
+        self.added_urls = set()
+        self.all_listings = []
+        self.newly_found = []
+        self.reactivated = []
+
+    def see(self, url: str):
+        self.seen_urls.add(url)
+
+    def add(self, listing: Dict) -> Optional[str]:
+        """Add a scraped listing. Returns 'new', 'reactivated', 'existing' or None if skipped."""
+        self.see(listing['url'])
+        self.listed_urls.add(listing['url'])
+        existing = self.index.get(listing['url'])
+        if existing is None:
+            # Event time used by the adaptive scheduler to learn when the source publishes
+            listing['first_seen'] = datetime.now().isoformat()
+            self.added_urls.add(listing['url'])
+            self.all_listings.append(listing)
+            self.newly_found.append(listing)
+            return 'new'
+
+        state = 'existing'
+        if not existing.get('active', True):
+            if not self.reactivate_inactive:
+                return None
+            self.reactivated.append(listing)
+            state = 'reactivated'
+            listing['last_updated'] = datetime.now().isoformat()
+
+        # Preserve message_id and channel_id so the Discord message can be edited later
+        for key in MESSAGE_KEYS:
+            if key in existing:
+                listing[key] = existing[key]
+        # Keep the event times of the stored listing (unless it was just reactivated)
+        for key in ('first_seen', 'last_updated'):
+            if key in existing and key not in listing:
+                listing[key] = existing[key]
+        self.added_urls.add(listing['url'])
+        self.all_listings.append(listing)
+        return state
+
+    def incomplete_urls(self) -> set:
+        """URLs still listed on the site that didn't produce a complete listing (SeenUrl only)"""
+        return self.seen_urls - self.listed_urls
+
+    def finish(self) -> Tuple[List[Dict], List[Dict], List[Dict], List[Dict]]:
+        """Mark stored listings that weren't seen as removed and return the full result"""
+        removed_listings = []
+        now = datetime.now()
+        for url, existing in self.index.items():
+            if url not in self.seen_urls and existing.get('active', True):
+                existing['active'] = False
+                existing['removed_at'] = now.strftime('%Y-%m-%d')
+                existing['last_updated'] = now.isoformat()
+                removed_listings.append(existing)
+                self.all_listings.append(existing)
+            elif url not in self.added_urls:
+                # Still listed but incomplete this time (e.g. its detail page failed), or removed
+                # earlier and kept for the retention window: keep it as stored
+                self.all_listings.append(existing)
+
+        return self.all_listings, self.newly_found, removed_listings, self.reactivated
+
+    def partial(self) -> Tuple[List[Dict], List[Dict], List[Dict], List[Dict]]:
+        """
+        Result of an interrupted scrape: what was found so far, plus every stored
+        listing that wasn't re-scraped, unchanged. Nothing is marked removed.
+        """
+        carried = [existing for url, existing in self.index.items() if url not in self.added_urls]
+        return self.all_listings + carried, self.newly_found, [], self.reactivated
+
+
 class RentalScraper(ABC):
-    @abstractmethod
+    """
+    Scrapers implement either iter_listings (streaming, preferred) or scrape.
+
+    iter_listings yields listings (from create_listing) as they are parsed, plus
+    SeenUrl for URLs that are listed but incomplete. stream() diffs them one by one,
+    so new listings can be notified before the scraper has finished.
+    """
+
+    # Whether a listing previously marked inactive is reactivated when it shows up again
+    reactivate_inactive = False
+    # Company name shown in notification titles for listings on the domain of self.url
+    company: Optional[str] = None
+
+    @property
+    def source(self) -> str:
+        """Name stored in the source field of this scraper's listings"""
+        return self.__class__.__name__
+
+    def iter_listings(self, existing_listings: List[Dict]) -> Iterator[Union[Dict, SeenUrl]]:
+        raise NotImplementedError
+
     def scrape(self, existing_listings: List[Dict]) -> Tuple[List[Dict], List[Dict], List[Dict], List[Dict]]:
         """
         Scrape website and return tuple of:
         (all_listings, new_listings, removed_listings, reactivated_listings)
         """
-        pass
-
-    def create_listing(self, **kwargs) -> Dict[str, Any]:
-        """Create a standard listing dictionary"""
-        return {
-            'address': kwargs.get('address'),
-            'url': kwargs.get('url'),
-            'price': kwargs.get('price', 'N/A'),
-            'size': kwargs.get('size'),
-            'rooms': kwargs.get('rooms'),
-            'available': kwargs.get('available'),
-            'image_url': kwargs.get('image_url'),
-            'active': True,
-            'source': self.__class__.__name__
-        }
+        return self.stream(existing_listings)
+
+    def stream(self, existing_listings: List[Dict],
+               on_new: Optional[Callable[[Dict], None]] = None,
+               cancelled: Optional[threading.Event] = None) -> Tuple[List[Dict], List[Dict], List[Dict], List[Dict]]:
+        """
+        Run the scraper through the shared diff stage, calling on_new(listing) as
+        soon as each new listing is found. Returns the same tuple as scrape().
+        Once cancelled is set the caller has stopped taking listings, so the page
+        isn't committed and the next run scrapes it again.
+        """
+        source = self.source
+        if type(self).iter_listings is RentalScraper.iter_listings:
+            if type(self).scrape is RentalScraper.scrape:
+                # scrape() would call stream() again, recursing until RecursionError
+                raise NotImplementedError(f"{type(self).__name__} must implement iter_listings or scrape")
+            # Compatibility shim for scrapers that only implement scrape()
+            try:
+                result = self.scrape(existing_listings)
+            except Exception as e:
+                print(f"Error in {source}: {e}")
+                metrics.count(source, 'errors')
+                return ListingDiff(source, existing_listings, self.reactivate_inactive).partial()
+            for listing in result[0]:
+                if 'rent' not in listing:
+                    normalize_listing(listing)
+            if on_new:
+                for listing in result[1]:
+                    on_new(listing)
+            return result
+
+        diff = ListingDiff(source, existing_listings, self.reactivate_inactive)
+        # Diffing is interleaved with fetching and parsing, so its time is summed over all items
+        diff_time = 0.0
+        try:
+            for item in self.iter_listings(existing_listings):
+                started = time.perf_counter()
+                if isinstance(item, SeenUrl):
+                    diff.see(item)
+                    diff_time += time.perf_counter() - started
+                    continue
+                # Parse numeric fields once at ingest; the display strings are kept for notifications
+                normalize_listing(item)
+                state = diff.add(item)
+                diff_time += time.perf_counter() - started
+                metrics.count(source, 'listings')
+                if state == 'new' and on_new:
+                    metrics.count(source, 'new')
+                    on_new(item)
+        except SourceUnchanged:
+            print(f"{source}: page unchanged since last run, skipping parse")
+            metrics.count(source, 'unchanged')
+            return self.unchanged_result(existing_listings)
+        except Exception as e:
+            # Keep what was already found and the stored listings, but don't mark anything
+            # removed from an incomplete scrape
+            print(f"Error in {source}: {e}")
+            metrics.count(source, 'errors')
+            return diff.partial()
+
+        started = time.perf_counter()
+        result = diff.finish()
+        metrics.record(source, 'diff', diff_time + time.perf_counter() - started)
+        if not diff.incomplete_urls() and not (cancelled and cancelled.is_set()):
+            # Only a fully processed page may be skipped as unchanged next time; otherwise
+            # listings whose details failed would never be retried
+            self.commit_listings_page()
+        return result
+
+    def commit_listings_page(self):
+        """
+        Called after a complete scrape. Scrapers that fetch self.url through HttpClient
+        get response.unchanged for it on later runs only from then on.
+        """
+        http = getattr(self, 'http', None)
+        url = getattr(self, 'url', None)
+        if http is not None and url:
+            http.commit(url)
+
+    def has_stored_listings(self, existing_listings: List[Dict]) -> bool:
+        source = self.source
+        return any(l.get('source') == source and l.get('active', True) for l in existing_listings)
+
+    def unchanged_result(self, existing_listings: List[Dict]) -> Tuple[List[Dict], List[Dict], List[Dict], List[Dict]]:
+        """Result for a source whose page hasn't changed since the last run"""
+        source = self.source
+        listings = [l for l in existing_listings if l.get('source') == source]
+        # Listings stored before normalization was added
+        for listing in listings:
+            if 'rent' not in listing:
+                normalize_listing(listing)
+        return listings, [], [], []
+
+    def create_listing(self, **kwargs) -> Listing:
+        """Create a standard listing record"""
+        return Listing(
+            address=kwargs.get('address'),
+            url=kwargs.get('url'),
+            price=kwargs.get('price', 'N/A'),
+            size=kwargs.get('size'),
+            rooms=kwargs.get('rooms'),
+            available=kwargs.get('available'),
+            image_url=kwargs.get('image_url'),
+            active=True,
+            source=self.source
+        )
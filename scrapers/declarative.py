@@ -0,0 +1,163 @@
+import json
+import re
+import threading
+from typing import Dict, Iterator, List, Optional, Union
+from urllib.parse import urljoin
+
+from .base import RentalScraper, SeenUrl, SourceUnchanged
+from .http_client import HttpClient
+from .metrics import metrics
+
+# Listing fields a site definition can fill
+LISTING_FIELDS = ('address', 'url', 'price', 'size', 'rooms', 'available', 'image_url')
+# Fields that must be found for a listing to be created; otherwise its URL only counts as seen
+DEFAULT_REQUIRED_FIELDS = ('address', 'url', 'size', 'rooms')
+# Fields resolved against the page URL when relative
+URL_FIELDS = ('url', 'image_url')
+FORMATS = ('json', 'html')
+
+DEFAULT_HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
+}
+
+_shared_http = None
+_shared_http_lock = threading.Lock()
+
+
+def shared_http_client() -> HttpClient:
+    """
+    One keep-alive pool for every declarative site. Politeness limits and the
+    circuit breaker are per host, so sites don't slow each other down.
+    """
+    global _shared_http
+    with _shared_http_lock:
+        if _shared_http is None:
+            _shared_http = HttpClient(headers=DEFAULT_HEADERS, scope='declarative')
+        return _shared_http
+
+
+def json_path(data, path: str):
+    """Value at a dotted path such as 'data.objects' or 'images.0.url' ('' is the root), or None"""
+    if not path:
+        return data
+    for key in path.split('.'):
+        if isinstance(data, list):
+            try:
+                data = data[int(key)]
+            except (ValueError, IndexError):
+                return None
+        elif isinstance(data, dict):
+            data = data.get(key)
+        else:
+            return None
+        if data is None:
+            return None
+    return data
+
+
+def field_spec(spec: Union[str, Dict], site_format: str) -> Dict:
+    """A field definition as a dict; a plain string is a JSON path or a CSS selector"""
+    if isinstance(spec, dict):
+        return spec
+    return {'path': spec} if site_format == 'json' else {'selector': spec}
+
+
+class DeclarativeScraper(RentalScraper):
+    """
+    Scraper configured by a site definition (sites/*.json, see README) instead of code.
+    The listings page is a JSON API or HTML; 'items' is the JSON path or CSS selector of
+    the listing entries and 'fields' maps each listing field to a path or selector within
+    an entry, optionally with an attribute, a regex and a format template.
+    """
+
+    def __init__(self, definition: Dict):
+        self.name = definition['name']
+        self._source = definition.get('source') or self.name
+        self.company = definition.get('company')
+        self.url = definition['url']
+        self.base_url = definition.get('base_url') or self.url
+        self.format = definition.get('format', 'json')
+        if self.format not in FORMATS:
+            raise ValueError(f"Unknown format {self.format!r} for site {self.name}")
+        self.items = definition['items']
+        self.fields = {field: field_spec(spec, self.format) for field, spec in definition['fields'].items()}
+        self.required = tuple(definition.get('required', DEFAULT_REQUIRED_FIELDS))
+        # Only keep listings in this city, matched in the 'city' field if defined, otherwise in the address
+        self.city = definition.get('city')
+        self.reactivate_inactive = definition.get('reactivate_inactive', False)
+        self.headers = definition.get('headers')
+        self.http = shared_http_client()
+
+    @property
+    def source(self) -> str:
+        return self._source
+
+    def extract(self, item, spec: Dict) -> Optional[str]:
+        if 'value' in spec:
+            value = spec['value']
+        elif self.format == 'json':
+            value = json_path(item, spec.get('path', ''))
+            if isinstance(value, list):
+                value = ' '.join(str(v) for v in value)
+        else:
+            element = item.select_one(spec['selector']) if spec.get('selector') else item
+            if element is None:
+                return None
+            value = element.get(spec['attr']) if spec.get('attr') else element.get_text(' ', strip=True)
+        if value is None or value == '':
+            return None
+
+        text = str(value).strip()
+        if spec.get('pattern'):
+            match = re.search(spec['pattern'], text)
+            if not match:
+                return None
+            text = (match.group(1) if match.groups() else match.group(0)).strip()
+        if spec.get('template'):
+            text = spec['template'].format(text)
+        return text or None
+
+    def parse_listings(self, content: bytes) -> List[Dict]:
+        """Raw field values of every listing entry on the page"""
+        if self.format == 'json':
+            entries = json_path(json.loads(content), self.items)
+            if not isinstance(entries, list):
+                raise ValueError(f"{self.items!r} is not a list in the response from {self.url}")
+        else:
+            # bs4 is only needed by HTML sites
+            from .parsing import make_soup
+            entries = make_soup(content).select(self.items)
+
+        results = []
+        for entry in entries:
+            values = {field: self.extract(entry, spec) for field, spec in self.fields.items()}
+            for field in URL_FIELDS:
+                if values.get(field):
+                    values[field] = urljoin(self.base_url, values[field])
+            results.append(values)
+        return results
+
+    def in_city(self, values: Dict) -> bool:
+        if not self.city:
+            return True
+        text = values.get('city') if 'city' in self.fields else values.get('address')
+        return bool(text) and self.city.casefold() in text.casefold()
+
+    def iter_listings(self, existing_listings: List[Dict]) -> Iterator[Union[Dict, SeenUrl]]:
+        response = self.http.get(self.url, scope=self.source, headers=self.headers)
+        response.raise_for_status()
+        # Nothing changed since the last run, no need to parse and diff
+        if response.unchanged and self.has_stored_listings(existing_listings):
+            raise SourceUnchanged()
+
+        with metrics.span(self.source, 'parse'):
+            parsed = self.parse_listings(response.content)
+
+        for values in parsed:
+            if not values.get('url') or not self.in_city(values):
+                continue
+            if all(values.get(field) for field in self.required):
+                yield self.create_listing(**{field: values[field] for field in LISTING_FIELDS if values.get(field)})
+            else:
+                # Still listed, so don't treat it as removed
+                yield SeenUrl(values['url'])
@@ -0,0 +1,152 @@
+import os
+import re
+import unicodedata
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+from .base import MESSAGE_KEYS
+
+# How long a removed listing can still be matched by a re-posted one
+DEDUP_WINDOW_DAYS = int(os.environ.get('DEDUP_WINDOW_DAYS', 14))
+# Width of the size buckets in m²; neighbouring buckets are searched too
+SIZE_BUCKET = 5.0
+# Tolerances for listings that describe the same flat
+MAX_AREA_DIFF = 2.0
+MAX_RENT_DIFF = 0.03
+
+ADDRESS_PATTERN = re.compile(r'^(.*?)\s*(\d+)\s*([a-z]?)\b')
+
+
+def parse_address(address: Optional[str]) -> Tuple[str, Optional[str]]:
+    """'Storgatan 12 B, Sundsvall' -> ('storgatan', '12b')"""
+    text = unicodedata.normalize('NFKC', address or '').lower().split(',')[0].strip()
+    match = ADDRESS_PATTERN.match(text)
+    if match and match.group(1):
+        street, number = match.group(1), match.group(2) + match.group(3)
+    else:
+        street, number = text, None
+    return re.sub(r'[^\w]+', ' ', street).strip(), number
+
+
+def fingerprint(listing: Dict) -> Optional[Tuple]:
+    """Normalized (street, number, area, rooms, rent), or None if there's too little to match on"""
+    street, number = parse_address(listing.get('address'))
+    # Without a house number a street and size match far too many different flats
+    if not street or not number or listing.get('area') is None:
+        return None
+    return street, number, listing['area'], listing.get('room_count'), listing.get('rent')
+
+
+def _same_flat(a: Tuple, b: Tuple) -> bool:
+    _, number_a, area_a, rooms_a, rent_a = a
+    _, number_b, area_b, rooms_b, rent_b = b
+    if number_a != number_b:
+        return False
+    if abs(area_a - area_b) > MAX_AREA_DIFF:
+        return False
+    # Rooms and rent missing on either side don't rule out a match
+    if rooms_a is not None and rooms_b is not None and rooms_a != rooms_b:
+        return False
+    if rent_a and rent_b and abs(rent_a - rent_b) > MAX_RENT_DIFF * max(rent_a, rent_b):
+        return False
+    return True
+
+
+def merge_duplicate(listing: Dict, original: Dict):
+    """Make listing share the Discord message of the listing it duplicates"""
+    for key in MESSAGE_KEYS:
+        if key in original:
+            listing[key] = original[key]
+    listing['duplicate_of'] = original.get('duplicate_of') or original['url']
+
+
+class DuplicateIndex:
+    """
+    Notified listings blocked by (street, size bucket), so a new listing is only
+    compared with the few listings on the same street with a similar size.
+    Removed listings are kept as candidates for DEDUP_WINDOW_DAYS, to catch re-posts.
+    """
+
+    def __init__(self, listings: List[Dict] = (), window_days: int = DEDUP_WINDOW_DAYS):
+        self.cutoff = (datetime.now() - timedelta(days=window_days)).strftime('%Y-%m-%d')
+        self.blocks = {}
+        # New listings held back by split() until the scrape is done
+        self.pending = []
+        for listing in listings:
+            # Only listings with a message can be merged into
+            if listing.get('message_id'):
+                self.add(listing)
+
+    def add(self, listing: Dict):
+        key = fingerprint(listing)
+        if key is None:
+            return
+        if not listing.get('active', True) and (listing.get('removed_at') or '') < self.cutoff:
+            return
+        block = (key[0], int(key[2] // SIZE_BUCKET))
+        self.blocks.setdefault(block, []).append((key, listing))
+
+    def _matches(self, listing: Dict):
+        # Indexed listings describing the same flat as listing, under another URL
+        key = fingerprint(listing)
+        if key is None:
+            return
+        bucket = int(key[2] // SIZE_BUCKET)
+        for neighbour in (bucket, bucket - 1, bucket + 1):
+            for candidate_key, candidate in self.blocks.get((key[0], neighbour), ()):
+                if candidate['url'] != listing['url'] and _same_flat(key, candidate_key):
+                    yield candidate
+
+    def find(self, listing: Dict) -> Optional[Dict]:
+        """
+        Stored listing describing the same flat under another URL, if any. A listing
+        from the same source only matches once it is removed: two listings a site
+        shows at the same time are different flats, however similar.
+        """
+        for candidate in self._matches(listing):
+            if candidate.get('source') == listing.get('source') and candidate.get('active', True):
+                continue
+            return candidate
+        return None
+
+    def split(self, listings: List[Dict]) -> Tuple[List[Dict], List[Tuple[Dict, Dict]]]:
+        """
+        Split newly found listings into fresh ones and (duplicate, original) pairs.
+        Fresh listings are added to the index, so later duplicates of them are found too.
+        Listings that only match an active listing from their own source are held back
+        in pending: the site may have moved the flat to a new URL, which is only known
+        once the scrape has marked the old one removed (see resolve_pending).
+        """
+        fresh = []
+        duplicates = []
+        for listing in listings:
+            original = self.find(listing)
+            if original is not None:
+                duplicates.append((listing, original))
+            elif any(candidate.get('source') == listing.get('source') for candidate in self._matches(listing)):
+                self.pending.append(listing)
+            else:
+                fresh.append(listing)
+                self.add(listing)
+        return fresh, duplicates
+
+    def resolve_pending(self, removed: List[Dict]) -> Tuple[List[Dict], List[Tuple[Dict, Dict]]]:
+        """
+        Split the listings held back by split() once the scrape is done: those whose
+        same-source match was removed in it are that listing under a new URL, the rest
+        are fresh.
+        """
+        removed_urls = {listing['url'] for listing in removed}
+        pending, self.pending = self.pending, []
+        fresh = []
+        duplicates = []
+        for listing in pending:
+            original = next((candidate for candidate in self._matches(listing)
+                             if candidate.get('source') == listing.get('source')
+                             and candidate['url'] in removed_urls), None)
+            if original is not None:
+                duplicates.append((listing, original))
+            else:
+                fresh.append(listing)
+                self.add(listing)
+        return fresh, duplicates
@@ -0,0 +1,65 @@
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from .http_client import CACHE_DIR
+
+DETAIL_CACHE_FILE = os.path.join(CACHE_DIR, 'details.json')
+DETAIL_CACHE_TTL = float(os.environ.get('DETAIL_CACHE_TTL', 24 * 60 * 60))
+DETAIL_CACHE_MAX_ENTRIES = int(os.environ.get('DETAIL_CACHE_MAX_ENTRIES', 1000))
+
+
+class DetailCache:
+    """Listing detail pages keyed by URL, with a TTL and LRU eviction"""
+
+    def __init__(self, path=DETAIL_CACHE_FILE, ttl=DETAIL_CACHE_TTL, max_entries=DETAIL_CACHE_MAX_ENTRIES):
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries = None
+
+    def _load(self):
+        if self._entries is None:
+            self._entries = OrderedDict()
+            try:
+                with open(self.path, 'r', encoding='utf-8') as f:
+                    # Stored least recently used first
+                    for url, entry in json.load(f):
+                        self._entries[url] = entry
+            except (OSError, ValueError):
+                pass
+        return self._entries
+
+    def get(self, url):
+        """Return cached details for url, or None if missing or older than the TTL"""
+        with self._lock:
+            entries = self._load()
+            entry = entries.get(url)
+            if not entry:
+                return None
+            if time.time() - entry['fetched_at'] > self.ttl:
+                del entries[url]
+                return None
+            entries.move_to_end(url)
+            return entry['details']
+
+    def put(self, url, details, fetched_at=None):
+        with self._lock:
+            entries = self._load()
+            entries[url] = {'details': details, 'fetched_at': fetched_at or time.time()}
+            entries.move_to_end(url)
+            while len(entries) > self.max_entries:
+                entries.popitem(last=False)
+
+    def save(self):
+        with self._lock:
+            if self._entries is None:
+                return
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(list(self._entries.items()), f, ensure_ascii=False)
+            os.replace(tmp_path, self.path)
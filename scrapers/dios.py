@@ -1,119 +1,212 @@
 import re
-from bs4 import BeautifulSoup
-import requests
+from html.parser import HTMLParser
 from datetime import datetime
 import os
-from .base import RentalScraper
+import time
+from concurrent.futures import ThreadPoolExecutor
+from .base import RentalScraper, SeenUrl, SourceUnchanged
+from .http_client import HttpClient
+from .detail_cache import DetailCache
+from .metrics import metrics
 import json
 
-class DiosScraper(RentalScraper):
+class ListingFactsParser(HTMLParser):
+    """
+    Single pass over a Dios detail page collecting size, rooms and access date from
+    the facts highlight block, without building a tree. Sets done once all are found.
+    """
+
     def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.details = {}
+        self.done = False
+        self._pairs = []            # (number, unit) text of the highlighted facts
+        self._pending_number = None
+        self._last_title = None
+        self._field = None          # what the captured text is for
+        self._tag = None
+        self._depth = 0
+        self._text = []
+
+    def handle_starttag(self, tag, attrs):
+        if self._field:
+            if tag == self._tag:
+                self._depth += 1
+            return
+
+        classes = (dict(attrs).get('class') or '').split()
+        if tag == 'span' and 'object-factshighlightnumber' in classes:
+            self._capture('number', tag)
+        elif tag == 'span' and 'object-factshighlightunit' in classes and self._pending_number is not None:
+            self._capture('unit', tag)
+        elif tag == 'dt' and 'object-factshighlightdetailtitle' in classes:
+            self._capture('title', tag)
+        elif tag == 'dd' and 'object-factshighlightdetailvalue' in classes and self._last_title == 'Tillträde':
+            self._capture('available', tag)
+
+    def handle_data(self, data):
+        if self._field:
+            self._text.append(data)
+
+    def handle_endtag(self, tag):
+        if not self._field or tag != self._tag:
+            return
+        if self._depth:
+            self._depth -= 1
+            return
+
+        text = ''.join(self._text).strip()
+        field, self._field = self._field, None
+        if field == 'number':
+            self._pending_number = text
+        elif field == 'unit':
+            self._pairs.append(f"{self._pending_number} {text}")
+            self._pending_number = None
+        elif field == 'title':
+            self._last_title = text
+        elif field == 'available':
+            self.details['available'] = text
+            self._last_title = None
+
+        # The first highlighted fact is the size, the second the number of rooms
+        if len(self._pairs) > 0:
+            self.details['size'] = self._pairs[0]
+        if len(self._pairs) > 1:
+            self.details['rooms'] = self._pairs[1]
+        self.done = len(self._pairs) > 1 and 'available' in self.details
+
+    def _capture(self, field, tag):
+        self._field = field
+        self._tag = tag
+        self._depth = 0
+        self._text = []
+
+
+def extract_listing_facts(html, chunk_size=16384):
+    """Feed the page to ListingFactsParser in chunks, stopping as soon as all facts are found"""
+    parser = ListingFactsParser()
+    for start in range(0, len(html), chunk_size):
+        parser.feed(html[start:start + chunk_size])
+        if parser.done:
+            break
+    return parser.details
+
+
+def listing_timestamp(listing):
+    """Epoch seconds of the listing's last update (or when it was first seen), or None"""
+    value = listing.get('last_updated') or listing.get('first_seen')
+    try:
+        return datetime.fromisoformat(value).timestamp()
+    except (TypeError, ValueError):
+        return None
+
+
+class DiosScraper(RentalScraper):
+    reactivate_inactive = True
+
+    def __init__(self, max_workers=8, max_per_host=4):
         self.url = "https://www.dios.se/api/bostad"
         self.base_url = "https://www.dios.se"
         self.headers = {
             'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36',
             'Accept': 'application/json'
         }
+        # Number of detail pages fetched in parallel
+        self.max_workers = max_workers
+        # Shared keep-alive session, at most max_per_host requests in flight against dios.se
+        self.http = HttpClient(headers=self.headers, pool_size=max_workers, max_per_host=max_per_host,
+                               scope=self.source)
+        self.detail_cache = DetailCache()
 
     def get_listing_details(self, url):
         try:
-            response = requests.get(url, headers=self.headers)
+            response = self.http.get(url)
             response.raise_for_status()
-            soup = BeautifulSoup(response.content, 'html.parser')
-
-            details = {}
-
-            # Get size
-            size_number = soup.find('span', class_='object-factshighlightnumber')
-            size_unit = size_number.find_next_sibling('span', class_='object-factshighlightunit') if size_number else None
-            if size_number and size_unit:
-                details['size'] = f"{size_number.text.strip()} {size_unit.text.strip()}"
-
-            # Get rooms
-            rooms_number = soup.find_all('span', class_='object-factshighlightnumber')[1] if len(soup.find_all('span', class_='object-factshighlightnumber')) > 1 else None
-            rooms_unit = rooms_number.find_next_sibling('span', class_='object-factshighlightunit') if rooms_number else None
-            if rooms_number and rooms_unit:
-                details['rooms'] = f"{rooms_number.text.strip()} {rooms_unit.text.strip()}"
-
-            # Get available date
-            available_title = soup.find('dt', class_='object-factshighlightdetailtitle', string='Tillträde')
-            if available_title:
-                available_value = available_title.find_next_sibling('dd', class_='object-factshighlightdetailvalue')
-                if available_value:
-                    details['available'] = available_value.text.strip()
+            # Decode as UTF-8 unless the server says otherwise (requests would assume ISO-8859-1)
+            content_type = response.headers.get('Content-Type', '').lower()
+            encoding = response.encoding if 'charset=' in content_type else 'utf-8'
+            with metrics.span(self.source, 'parse_details'):
+                details = extract_listing_facts(response.content.decode(encoding, errors='replace'))
 
             return details
         except Exception as e:
             print(f"Error getting details from {url}: {e}")
             return None
 
-    def scrape(self, existing_listings):
+    def iter_details(self, urls, existing_listings):
+        """Yield (url, details) in url order, only fetching detail pages that are new or stale"""
+        source = self.source
+        known = {l['url']: l for l in existing_listings if l.get('source') == source and l.get('active', True)}
+        details_by_url = {}
+        now = time.time()
+        for url in urls:
+            details = self.detail_cache.get(url)
+            if details is None and url in known:
+                # Reuse the details stored with a known listing, aged by when that listing was
+                # last scraped so they are still refetched once older than the TTL
+                listing = known[url]
+                fetched_at = listing_timestamp(listing)
+                if (fetched_at and now - fetched_at <= self.detail_cache.ttl
+                        and all(listing.get(key) for key in ('size', 'rooms', 'available'))):
+                    details = {key: listing[key] for key in ('size', 'rooms', 'available')}
+                    self.detail_cache.put(url, details, fetched_at=fetched_at)
+            if details is not None:
+                details_by_url[url] = details
+
+        missing = [url for url in urls if url not in details_by_url]
+        print(f"Fetching {len(missing)} of {len(urls)} detail pages")
         try:
-            print("\n=== Starting Dios Scraper ===")
-            response = requests.get(self.url, headers=self.headers)
-            response.raise_for_status()
-            
-            listings_data = response.json()
-            
-            sundsvall_listings = [l for l in listings_data if l['city'].upper() == 'SUNDSVALL']
-            
-            current_urls = set()
-            newly_found = []
-            filtered_listings = []
-            reactivated = []
-            
-            for item in sundsvall_listings:
-                try:
-                    full_url = f"{self.base_url}{item['url']}"
-                    current_urls.add(full_url)
-                    
-                    # Get additional details from listing page
-                    details = self.get_listing_details(full_url)
-                    if not details:
+            # Fetch detail pages concurrently; map() yields results in url order as they complete
+            with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+                fetched = executor.map(self.get_listing_details, missing)
+                for url in urls:
+                    if url in details_by_url:
+                        yield url, details_by_url[url]
                         continue
+                    details = next(fetched)
+                    if details:
+                        self.detail_cache.put(url, details)
+                    yield url, details
+        finally:
+            self.detail_cache.save()
 
-                    address_match = re.search(r'(\d+)\s*kvm\s+på\s+([^,]+)', item['name'])
-                    if not address_match:
-                        continue
-                        
-                    address = address_match.group(2).strip()
-                    
-                    listing = self.create_listing(
-                        address=address,
-                        url=full_url,
-                        size=details.get('size', f"{item['areaTotal']} KVM"),
-                        rooms=details.get('rooms', 'N/A'),
-                        price=f"{item['rent']}:-/månad",
-                        available=details.get('available', 'Kontakta uthyrare'),
-                        image_url=f"{self.base_url}{item['image']}" if item.get('image') else None
-                    )
-                    
-                    existing = next((l for l in existing_listings if l['url'] == full_url), None)
-                    if existing:
-                        if not existing.get('active', True):
-                            reactivated.append(listing)
-                        for key in ['message_id', 'channel_id']:
-                            if key in existing:
-                                listing[key] = existing[key]
-                        filtered_listings.append(listing)
-                    else:
-                        filtered_listings.append(listing)
-                        newly_found.append(listing)
-                        
-                except Exception as e:
-                    print(f"Error processing listing: {str(e)}")
+    def iter_listings(self, existing_listings):
+        print("\n=== Starting Dios Scraper ===")
+        response = self.http.get(self.url)
+        response.raise_for_status()
+        # Nothing changed since the last run, no need to parse and diff
+        if response.unchanged and self.has_stored_listings(existing_listings):
+            raise SourceUnchanged()
+
+        with metrics.span(self.source, 'parse'):
+            listings_data = response.json()
+        sundsvall_listings = [l for l in listings_data if l['city'].upper() == 'SUNDSVALL']
+        items_by_url = {f"{self.base_url}{item['url']}": item for item in sundsvall_listings}
+
+        for full_url, details in self.iter_details(list(items_by_url), existing_listings):
+            # Every URL returned by the API counts as current, even if its details failed
+            yield SeenUrl(full_url)
+            item = items_by_url[full_url]
+            try:
+                if not details:
                     continue
 
-            removed_listings = []
-            for listing in existing_listings:
-                if listing['source'] == 'DiosScraper' and listing['url'] not in current_urls and listing.get('active', True):
-                    listing['active'] = False
-                    listing['removed_at'] = datetime.now().strftime('%Y-%m-%d')
-                    removed_listings.append(listing)
-                    filtered_listings.append(listing)
+                address_match = re.search(r'(\d+)\s*kvm\s+på\s+([^,]+)', item['name'])
+                if not address_match:
+                    continue
 
-            return filtered_listings, newly_found, removed_listings, reactivated
-            
-        except Exception as e:
-            print(f"Error in Dios scraper: {str(e)}")
-            return [], [], [], []
+                address = address_match.group(2).strip()
+
+                listing = self.create_listing(
+                    address=address,
+                    url=full_url,
+                    size=details.get('size', f"{item['areaTotal']} KVM"),
+                    rooms=details.get('rooms', 'N/A'),
+                    price=f"{item['rent']}:-/månad",
+                    available=details.get('available', 'Kontakta uthyrare'),
+                    image_url=f"{self.base_url}{item['image']}" if item.get('image') else None
+                )
+            except Exception as e:
+                print(f"Error processing listing: {str(e)}")
+                continue
+            yield listing
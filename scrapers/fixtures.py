@@ -0,0 +1,94 @@
+import hashlib
+import json
+import os
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+from requests.structures import CaseInsensitiveDict
+from requests.utils import get_encoding_from_headers
+
+# 'record' saves every response, 'replay' serves the saved responses without network access
+HTTP_FIXTURES_MODE = os.environ.get('HTTP_FIXTURES_MODE', '')
+HTTP_FIXTURES_DIR = os.environ.get('HTTP_FIXTURES_DIR', os.path.join('fixtures', 'http'))
+# Seconds added to every replayed response, to simulate a slow site
+HTTP_FIXTURES_LATENCY = float(os.environ.get('HTTP_FIXTURES_LATENCY', 0))
+
+# Conditional request headers, which the live site would answer with an empty 304
+CONDITIONAL_HEADERS = ('If-None-Match', 'If-Modified-Since')
+# The body is stored decoded, so these no longer describe it
+DROPPED_HEADERS = ('Content-Encoding', 'Transfer-Encoding', 'Content-Length')
+
+
+class FixtureAdapter(HTTPAdapter):
+    """
+    Transport adapter that records responses to fixture files, or replays them.
+    It sits below HttpClient, so the cache, host limits and metrics behave as against the live site.
+    """
+
+    def __init__(self, mode, directory=HTTP_FIXTURES_DIR, latency=HTTP_FIXTURES_LATENCY, **kwargs):
+        super().__init__(**kwargs)
+        if mode not in ('record', 'replay'):
+            raise ValueError(f"Unknown fixtures mode: {mode}")
+        self.mode = mode
+        self.directory = directory
+        self.latency = latency
+        self._lock = threading.Lock()
+
+    def _path(self, url):
+        return os.path.join(self.directory, hashlib.sha1(url.encode('utf-8')).hexdigest())
+
+    def send(self, request, **kwargs):
+        if self.mode == 'replay':
+            return self.replay(request)
+
+        for header in CONDITIONAL_HEADERS:
+            request.headers.pop(header, None)
+        response = super().send(request, **kwargs)
+        self.record(request, response)
+        return response
+
+    def record(self, request, response):
+        path = self._path(request.url)
+        meta = {
+            'url': request.url,
+            'status': response.status_code,
+            'reason': response.reason,
+            'headers': {k: v for k, v in response.headers.items() if k not in DROPPED_HEADERS},
+        }
+        with self._lock:
+            os.makedirs(self.directory, exist_ok=True)
+            with open(f"{path}.body", 'wb') as f:
+                f.write(response.content)
+            with open(f"{path}.json", 'w', encoding='utf-8') as f:
+                json.dump(meta, f, indent=2)
+
+    def replay(self, request):
+        if self.latency:
+            time.sleep(self.latency)
+        path = self._path(request.url)
+        try:
+            with open(f"{path}.json", 'r', encoding='utf-8') as f:
+                meta = json.load(f)
+            with open(f"{path}.body", 'rb') as f:
+                body = f.read()
+        except OSError:
+            raise requests.ConnectionError(f"No fixture recorded for {request.url}", request=request)
+
+        response = requests.Response()
+        response.url = request.url
+        response.request = request
+        response.headers = CaseInsensitiveDict(meta['headers'])
+        etag = response.headers.get('ETag')
+        if etag and request.headers.get('If-None-Match') == etag:
+            # Answer revalidation like the site would
+            response.status_code = 304
+            response.reason = 'Not Modified'
+            response._content = b''
+        else:
+            response.status_code = meta['status']
+            response.reason = meta.get('reason')
+            response._content = body
+        response.encoding = get_encoding_from_headers(response.headers)
+        return response
@@ -0,0 +1,340 @@
+import hashlib
+import json
+import os
+import random
+import threading
+import time
+from contextlib import contextmanager
+from urllib.parse import urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from .fixtures import HTTP_FIXTURES_MODE, FixtureAdapter
+from .metrics import metrics
+
+CACHE_DIR = os.environ.get('HTTP_CACHE_DIR', 'http_cache')
+CACHE_MAX_BYTES = int(os.environ.get('HTTP_CACHE_MAX_BYTES', 50 * 1024 * 1024))
+
+# Seconds to wait for a connection and between bytes of the response
+HTTP_CONNECT_TIMEOUT = float(os.environ.get('HTTP_CONNECT_TIMEOUT', 5))
+HTTP_READ_TIMEOUT = float(os.environ.get('HTTP_READ_TIMEOUT', 30))
+# Retries after a connection error, timeout or retryable status, with jittered exponential backoff
+HTTP_RETRIES = int(os.environ.get('HTTP_RETRIES', 3))
+HTTP_BACKOFF_BASE = float(os.environ.get('HTTP_BACKOFF_BASE', 0.5))
+HTTP_BACKOFF_MAX = float(os.environ.get('HTTP_BACKOFF_MAX', 10))
+RETRY_STATUSES = frozenset((429, 500, 502, 503, 504))
+# Consecutive failures after which a host is skipped, and for how many seconds
+CIRCUIT_FAILURES = int(os.environ.get('HTTP_CIRCUIT_FAILURES', 5))
+CIRCUIT_COOLDOWN = float(os.environ.get('HTTP_CIRCUIT_COOLDOWN', 60))
+
+
+class HostLimiter:
+    """Limit concurrent requests and request rate per host"""
+
+    def __init__(self, max_per_host=4, min_interval=0.1):
+        self.max_per_host = max_per_host
+        self.min_interval = min_interval
+        self._lock = threading.Lock()
+        self._semaphores = {}
+        self._next_slot = {}
+
+    @contextmanager
+    def limit(self, url):
+        host = urlparse(url).netloc
+        with self._lock:
+            semaphore = self._semaphores.setdefault(host, threading.BoundedSemaphore(self.max_per_host))
+
+        with semaphore:
+            # Reserve the next free start time for this host so requests are spaced out
+            with self._lock:
+                now = time.monotonic()
+                start = max(now, self._next_slot.get(host, now))
+                self._next_slot[host] = start + self.min_interval
+            if start > now:
+                time.sleep(start - now)
+            yield
+
+
+class CircuitOpenError(requests.ConnectionError):
+    """Raised without sending a request while the host's circuit is open"""
+
+
+class CircuitBreaker:
+    """
+    Per-host circuit breaker. After `failures` consecutive failed attempts the host
+    is skipped for `cooldown` seconds; then a single trial request either closes
+    the circuit again or reopens it.
+    """
+
+    def __init__(self, failures=CIRCUIT_FAILURES, cooldown=CIRCUIT_COOLDOWN):
+        self.failures = failures
+        self.cooldown = cooldown
+        self._lock = threading.Lock()
+        self._failures = {}
+        self._open_until = {}
+        self._trial = set()
+
+    def before(self, host):
+        with self._lock:
+            open_until = self._open_until.get(host)
+            if open_until is None:
+                return
+            if time.monotonic() < open_until or host in self._trial:
+                raise CircuitOpenError(f"Circuit open for {host}, skipping request")
+            # Cooldown is over: let this request through as the trial
+            self._trial.add(host)
+
+    def success(self, host):
+        with self._lock:
+            self._failures.pop(host, None)
+            self._open_until.pop(host, None)
+            self._trial.discard(host)
+
+    def failure(self, host):
+        with self._lock:
+            self._failures[host] = self._failures.get(host, 0) + 1
+            if host in self._trial or self._failures[host] >= self.failures:
+                if host not in self._open_until or host in self._trial:
+                    print(f"Opening circuit for {host} for {self.cooldown:g}s after {self._failures[host]} failures")
+                self._open_until[host] = time.monotonic() + self.cooldown
+                self._trial.discard(host)
+
+
+def backoff_delay(attempt, base=HTTP_BACKOFF_BASE, maximum=HTTP_BACKOFF_MAX):
+    """Full jitter: random delay up to base * 2^attempt, so retrying clients don't synchronize"""
+    return random.uniform(0, min(maximum, base * 2 ** attempt))
+
+
+def retry_after(response, maximum=HTTP_BACKOFF_MAX):
+    # Retry-After in seconds (the HTTP-date form is rare enough to fall back to backoff)
+    try:
+        return min(maximum, max(0.0, float(response.headers.get('Retry-After'))))
+    except (TypeError, ValueError):
+        return None
+
+
+class ResponseCache:
+    """On-disk cache of response bodies and their validators (ETag / Last-Modified)"""
+
+    def __init__(self, directory=CACHE_DIR, max_bytes=CACHE_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._index = None
+
+    @property
+    def index_path(self):
+        return os.path.join(self.directory, 'index.json')
+
+    def _key(self, url):
+        return hashlib.sha1(url.encode('utf-8')).hexdigest()
+
+    def _body_path(self, key):
+        return os.path.join(self.directory, f"{key}.body")
+
+    def _load_index(self):
+        if self._index is None:
+            try:
+                with open(self.index_path, 'r', encoding='utf-8') as f:
+                    self._index = json.load(f)
+            except (OSError, ValueError):
+                self._index = {}
+        return self._index
+
+    def _save_index(self):
+        os.makedirs(self.directory, exist_ok=True)
+        tmp_path = f"{self.index_path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self._index, f)
+        os.replace(tmp_path, self.index_path)
+
+    def lookup(self, url):
+        """Return (entry, body) for a cached url, or (None, None)"""
+        with self._lock:
+            key = self._key(url)
+            entry = self._load_index().get(key)
+            if not entry:
+                return None, None
+            try:
+                with open(self._body_path(key), 'rb') as f:
+                    body = f.read()
+            except OSError:
+                del self._index[key]
+                return None, None
+            entry['accessed'] = time.time()
+            return entry, body
+
+    def store(self, url, response):
+        """
+        Store a response body and return True if it is identical to the cached copy and
+        that copy was fully processed (see commit)
+        """
+        body = response.content
+        content_hash = hashlib.sha256(body).hexdigest()
+        with self._lock:
+            key = self._key(url)
+            index = self._load_index()
+            previous = index.get(key)
+            unchanged = previous is not None and previous.get('hash') == content_hash
+            # A new body isn't complete until the scraper has processed all of it
+            complete = unchanged and previous.get('complete', False)
+
+            os.makedirs(self.directory, exist_ok=True)
+            if not unchanged:
+                with open(self._body_path(key), 'wb') as f:
+                    f.write(body)
+            index[key] = {
+                'url': url,
+                'etag': response.headers.get('ETag'),
+                'last_modified': response.headers.get('Last-Modified'),
+                'hash': content_hash,
+                'size': len(body),
+                'accessed': time.time(),
+                'complete': complete,
+            }
+            self._evict()
+            self._save_index()
+            return complete
+
+    def commit(self, url):
+        """Mark the cached body of url as fully processed, so it can be skipped when unchanged"""
+        with self._lock:
+            entry = self._load_index().get(self._key(url))
+            if entry and not entry.get('complete'):
+                entry['complete'] = True
+                self._save_index()
+
+    def touch(self):
+        """Persist access times after 304 hits"""
+        with self._lock:
+            if self._index is not None:
+                self._save_index()
+
+    def _evict(self):
+        # Drop least recently used bodies until the cache fits in max_bytes
+        total = sum(entry['size'] for entry in self._index.values())
+        for key, entry in sorted(self._index.items(), key=lambda item: item[1]['accessed']):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(self._body_path(key))
+            except OSError:
+                pass
+            total -= entry['size']
+            del self._index[key]
+
+
+# Shared between all scrapers so the size limit applies to the whole cache
+response_cache = ResponseCache()
+# Shared so scrapers hitting the same host see each other's failures
+circuit_breaker = CircuitBreaker()
+
+
+class HttpClient:
+    """
+    Shared HTTP client with a keep-alive connection pool, per-host politeness limits,
+    timeouts, retries with backoff and a per-host circuit breaker
+    """
+
+    def __init__(self, headers=None, pool_size=10, max_per_host=4, min_interval=0.1, cache=response_cache, scope='http',
+                 timeout=(HTTP_CONNECT_TIMEOUT, HTTP_READ_TIMEOUT), retries=HTTP_RETRIES, breaker=circuit_breaker):
+        # Name the request metrics are recorded under (usually the scraper's class name)
+        self.scope = scope
+        self.session = requests.Session()
+        # Reuse connections across requests instead of a new TCP+TLS handshake per call
+        if HTTP_FIXTURES_MODE:
+            # Record or replay responses (see scrapers/fixtures.py)
+            adapter = FixtureAdapter(HTTP_FIXTURES_MODE, pool_connections=pool_size, pool_maxsize=pool_size)
+        else:
+            adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        if headers:
+            self.session.headers.update(headers)
+        self.limiter = HostLimiter(max_per_host=max_per_host, min_interval=min_interval)
+        self.cache = cache
+        self.timeout = timeout
+        self.retries = retries
+        self.breaker = breaker
+
+    def get(self, url, scope=None, **kwargs):
+        """
+        GET a url. With a cache, sends If-None-Match / If-Modified-Since and sets
+        response.unchanged when the server answers 304 or returns the same body.
+        scope overrides the client's metrics scope, for clients shared by several scrapers.
+        """
+        scope = scope or self.scope
+        entry, body = self.cache.lookup(url) if self.cache else (None, None)
+        if entry:
+            headers = dict(kwargs.pop('headers', None) or {})
+            if entry.get('etag'):
+                headers['If-None-Match'] = entry['etag']
+            if entry.get('last_modified'):
+                headers['If-Modified-Since'] = entry['last_modified']
+            kwargs['headers'] = headers
+
+        kwargs.setdefault('timeout', self.timeout)
+        response = self._send(url, scope, **kwargs)
+        metrics.count(scope, 'bytes', len(response.content or b''))
+
+        response.unchanged = False
+        if entry and response.status_code == 304:
+            # Serve the cached body as a normal 200 response
+            response.status_code = 200
+            response._content = body
+            # Only skippable if the last scrape of this body completed
+            response.unchanged = bool(entry.get('complete'))
+            metrics.count(scope, 'not_modified')
+            self.cache.touch()
+        elif self.cache and response.status_code == 200:
+            response.unchanged = self.cache.store(url, response)
+        return response
+
+    def _send(self, url, scope, **kwargs):
+        """
+        GET with retries on connection errors, timeouts and RETRY_STATUSES. Returns the
+        last response if it still has a retryable status, so the caller's raise_for_status
+        reports it; raises CircuitOpenError while the host is failing.
+        """
+        host = urlparse(url).netloc
+        for attempt in range(self.retries + 1):
+            if self.breaker:
+                self.breaker.before(host)
+            try:
+                with self.limiter.limit(url):
+                    metrics.count(scope, 'requests')
+                    with metrics.span(scope, 'fetch'):
+                        response = self.session.get(url, **kwargs)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                metrics.count(scope, 'errors')
+                if self.breaker:
+                    self.breaker.failure(host)
+                if attempt == self.retries:
+                    raise
+                delay = backoff_delay(attempt)
+                reason = e.__class__.__name__
+            else:
+                if response.status_code not in RETRY_STATUSES:
+                    if self.breaker:
+                        self.breaker.success(host)
+                    return response
+                metrics.count(scope, 'errors')
+                if self.breaker:
+                    self.breaker.failure(host)
+                if attempt == self.retries:
+                    return response
+                delay = retry_after(response) or backoff_delay(attempt)
+                reason = f"HTTP {response.status_code}"
+
+            metrics.count(scope, 'retries')
+            print(f"{reason} from {url}, retry {attempt + 1}/{self.retries} in {delay:.1f}s")
+            time.sleep(delay)
+
+    def commit(self, url):
+        """Mark the cached response for url as fully processed by its scraper"""
+        if self.cache:
+            self.cache.commit(url)
+
+    def close(self):
+        self.session.close()
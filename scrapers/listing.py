@@ -0,0 +1,147 @@
+import sys
+
+_MISSING = object()
+
+
+class Listing:
+    """
+    Compact listing record with a fixed set of __slots__ instead of a per-record dict.
+    Supports the dict operations the rest of the code uses (get, [], in, pop, copy),
+    and converts to and from the plain dicts stored on disk.
+    """
+
+    FIELDS = (
+        'address', 'url', 'price', 'size', 'rooms', 'available', 'image_url',
+        'active', 'source', 'first_seen', 'removed_at', 'last_updated',
+        'message_id', 'channel_id', 'embed_index', 'embed_count', 'notified_at',
+        'rent', 'area', 'room_count', 'available_date', 'duplicate_of',
+    )
+    # Unset slots stand in for missing keys; unknown keys go to _extra
+    __slots__ = FIELDS + ('_extra',)
+
+    _FIELD_SET = frozenset(FIELDS)
+    # Values repeated across many records are interned so they are stored once
+    _INTERNED = frozenset(('source', 'removed_at', 'notified_at', 'available_date'))
+
+    def __init__(self, **fields):
+        self._extra = None
+        for key, value in fields.items():
+            self[key] = value
+
+    @classmethod
+    def from_dict(cls, data):
+        # Called for every stored record on load, so the slots are set directly rather than through __setitem__
+        listing = cls.__new__(cls)
+        fields = cls._FIELD_SET
+        interned = cls._INTERNED
+        extra = None
+        for key, value in data.items():
+            if key in fields:
+                if key in interned and type(value) is str:
+                    value = sys.intern(value)
+                setattr(listing, key, value)
+            else:
+                if extra is None:
+                    extra = {}
+                extra[key] = value
+        listing._extra = extra
+        return listing
+
+    def to_dict(self):
+        data = {}
+        for key in self.FIELDS:
+            value = getattr(self, key, _MISSING)
+            if value is not _MISSING:
+                data[key] = value
+        if self._extra:
+            data.update(self._extra)
+        return data
+
+    def __getitem__(self, key):
+        if key in self._FIELD_SET:
+            value = getattr(self, key, _MISSING)
+            if value is _MISSING:
+                raise KeyError(key)
+            return value
+        if self._extra and key in self._extra:
+            return self._extra[key]
+        raise KeyError(key)
+
+    def __setitem__(self, key, value):
+        if key in self._FIELD_SET:
+            if key in self._INTERNED and type(value) is str:
+                value = sys.intern(value)
+            setattr(self, key, value)
+        else:
+            if self._extra is None:
+                self._extra = {}
+            self._extra[key] = value
+
+    def __delitem__(self, key):
+        if key in self._FIELD_SET:
+            if getattr(self, key, _MISSING) is _MISSING:
+                raise KeyError(key)
+            delattr(self, key)
+        elif self._extra and key in self._extra:
+            del self._extra[key]
+        else:
+            raise KeyError(key)
+
+    def __contains__(self, key):
+        if key in self._FIELD_SET:
+            return getattr(self, key, _MISSING) is not _MISSING
+        return bool(self._extra) and key in self._extra
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def pop(self, key, default=_MISSING):
+        try:
+            value = self[key]
+        except KeyError:
+            if default is _MISSING:
+                raise
+            return default
+        del self[key]
+        return value
+
+    def update(self, other):
+        for key, value in other.items():
+            self[key] = value
+
+    def keys(self):
+        return self.to_dict().keys()
+
+    def items(self):
+        return self.to_dict().items()
+
+    def __iter__(self):
+        return iter(self.keys())
+
+    def __len__(self):
+        return len(self.to_dict())
+
+    def copy(self):
+        return Listing.from_dict(self.to_dict())
+
+    def __eq__(self, other):
+        if isinstance(other, Listing):
+            return self.to_dict() == other.to_dict()
+        if isinstance(other, dict):
+            return self.to_dict() == other
+        return NotImplemented
+
+    __hash__ = None
+
+    def __repr__(self):
+        return f"Listing({self.to_dict()!r})"
+
+
+def to_json_value(obj):
+    """json.dump default= hook so Listing records serialize as plain objects"""
+    if isinstance(obj, Listing):
+        return obj.to_dict()
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
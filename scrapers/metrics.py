@@ -0,0 +1,152 @@
+import json
+import math
+import os
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+METRICS_FILE = os.environ.get('METRICS_FILE', 'metrics.json')
+METRICS_HISTORY_FILE = os.environ.get('METRICS_HISTORY_FILE', 'metrics_history.jsonl')
+# Number of runs kept in the history file
+METRICS_HISTORY_RUNS = int(os.environ.get('METRICS_HISTORY_RUNS', 500))
+# A stage is reported as a regression when it takes this much longer than its median over the history
+REGRESSION_FACTOR = 1.5
+
+
+def percentile(sorted_values, fraction):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return None
+    rank = max(0, min(len(sorted_values) - 1, math.ceil(fraction * len(sorted_values)) - 1))
+    return sorted_values[rank]
+
+
+class Metrics:
+    """
+    Timings and counters for one run, grouped by scope (a scraper's class name,
+    'storage' or 'discord') and stage (fetch, parse, diff, save, send, ...).
+    Thread-safe, since scrapers and their detail fetches run in worker threads.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.started_at = datetime.now()
+            self._started = time.perf_counter()
+            self.timings = {}
+            self.counters = {}
+
+    def record(self, scope, stage, seconds):
+        with self._lock:
+            self.timings.setdefault(scope, {}).setdefault(stage, []).append(seconds)
+
+    def count(self, scope, name, value=1):
+        with self._lock:
+            counters = self.counters.setdefault(scope, {})
+            counters[name] = counters.get(name, 0) + value
+
+    @contextmanager
+    def span(self, scope, stage):
+        """Time the body of a with block, also when it raises"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(scope, stage, time.perf_counter() - started)
+
+    def report(self):
+        """Summary of the run: per scope, latency stats for each stage plus counters"""
+        with self._lock:
+            timings = {scope: {stage: sorted(values) for stage, values in stages.items()}
+                       for scope, stages in self.timings.items()}
+            counters = {scope: dict(values) for scope, values in self.counters.items()}
+
+        scopes = {}
+        for scope in sorted(set(timings) | set(counters)):
+            stages = {}
+            for stage, values in timings.get(scope, {}).items():
+                stages[stage] = {
+                    'count': len(values),
+                    'total': round(sum(values), 4),
+                    'p50': round(percentile(values, 0.5), 4),
+                    'p90': round(percentile(values, 0.9), 4),
+                    'p99': round(percentile(values, 0.99), 4),
+                    'max': round(values[-1], 4),
+                }
+            scopes[scope] = {'stages': stages, 'counters': counters.get(scope, {})}
+
+        return {
+            'started_at': self.started_at.isoformat(),
+            'duration': round(time.perf_counter() - self._started, 4),
+            'scopes': scopes,
+        }
+
+    def write(self, path=METRICS_FILE, history_path=METRICS_HISTORY_FILE, history_runs=METRICS_HISTORY_RUNS):
+        """Write this run's report and append it to the rolling history. Returns the report."""
+        report = self.report()
+        history = read_history(history_path)
+        regressions = find_regressions(report, history)
+        if regressions:
+            report['regressions'] = regressions
+
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+        os.replace(tmp_path, path)
+
+        # Rewrite the history with only the newest runs
+        history = (history + [report])[-history_runs:]
+        tmp_path = f"{history_path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(''.join(json.dumps(run) + '\n' for run in history))
+        os.replace(tmp_path, history_path)
+        return report
+
+
+def read_history(path=METRICS_HISTORY_FILE):
+    runs = []
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    runs.append(json.loads(line))
+                except ValueError:
+                    continue
+    except OSError:
+        pass
+    return runs
+
+
+def find_regressions(report, history, factor=REGRESSION_FACTOR):
+    """Stages whose total time this run is over factor times their median in the history"""
+    regressions = []
+    for scope, data in report['scopes'].items():
+        for stage, stats in data['stages'].items():
+            previous = sorted(run['scopes'][scope]['stages'][stage]['total'] for run in history
+                              if stage in run.get('scopes', {}).get(scope, {}).get('stages', {}))
+            if len(previous) < 3:
+                continue
+            median = percentile(previous, 0.5)
+            if median and stats['total'] > factor * median:
+                regressions.append({'scope': scope, 'stage': stage, 'total': stats['total'], 'median': median})
+    return regressions
+
+
+def print_report(report):
+    print(f"\nRun metrics ({report['duration']:.2f}s):")
+    for scope, data in report['scopes'].items():
+        stages = ', '.join(f"{stage} {stats['total']:.2f}s/{stats['count']} (p90 {stats['p90'] * 1000:.0f}ms)"
+                           for stage, stats in data['stages'].items())
+        counters = ', '.join(f"{name}={value}" for name, value in data['counters'].items())
+        print(f"  {scope}: {'; '.join(part for part in (stages, counters) if part)}")
+    for regression in report.get('regressions', ()):
+        print(f"  Slower than usual: {regression['scope']} {regression['stage']} "
+              f"{regression['total']:.2f}s (median {regression['median']:.2f}s)")
+
+
+# Shared by the scrapers, storage and the Discord notifier
+metrics = Metrics()
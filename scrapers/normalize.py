@@ -0,0 +1,87 @@
+import re
+from datetime import date
+
+# \s also matches the non-breaking spaces used as thousands separators
+NUMBER_PATTERN = re.compile(r'(?:\d{1,3}(?:\s\d{3})+|\d+)(?:[.,]\d+)?')
+ISO_DATE_PATTERN = re.compile(r'(\d{4})-(\d{1,2})-(\d{1,2})')
+SWEDISH_DATE_PATTERN = re.compile(r'(\d{1,2})\s+([a-zåäö]+)\.?(?:\s+(\d{4}))?', re.IGNORECASE)
+IMMEDIATE_WORDS = ('omgående', 'snarast', 'direkt')
+
+SWEDISH_MONTHS = {
+    'jan': 1, 'feb': 2, 'mar': 3, 'apr': 4, 'maj': 5, 'jun': 6,
+    'jul': 7, 'aug': 8, 'sep': 9, 'okt': 10, 'nov': 11, 'dec': 12,
+}
+
+def _parse_number(text):
+    if not text:
+        return None
+    match = NUMBER_PATTERN.search(str(text))
+    if not match:
+        return None
+    number = re.sub(r'\s', '', match.group(0)).replace(',', '.')
+    try:
+        return float(number)
+    except ValueError:
+        return None
+
+
+def parse_rent(text):
+    """'8 500:-/månad' -> 8500"""
+    value = _parse_number(text)
+    return int(value) if value is not None else None
+
+
+def parse_area(text):
+    """'52,5 kvm' -> 52.5"""
+    return _parse_number(text)
+
+
+def parse_room_count(text):
+    """'2 rum' -> 2.0, '1,5 rok' -> 1.5"""
+    return _parse_number(text)
+
+
+def parse_available_date(text, today=None):
+    """
+    'Ledigt 2026-11-01', '1 november 2026' or 'Omgående' -> ISO date string.
+    Returns None when no date can be found (e.g. 'Kontakta uthyrare').
+    """
+    if not text:
+        return None
+    text = str(text)
+    today = today or date.today()
+
+    match = ISO_DATE_PATTERN.search(text)
+    if match:
+        try:
+            return date(*map(int, match.groups())).isoformat()
+        except ValueError:
+            return None
+
+    for match in SWEDISH_DATE_PATTERN.finditer(text):
+        month = SWEDISH_MONTHS.get(match.group(2).lower()[:3])
+        if not month:
+            continue
+        day = int(match.group(1))
+        year = int(match.group(3)) if match.group(3) else today.year
+        try:
+            parsed = date(year, month, day)
+        except ValueError:
+            return None
+        # Without a year, a month that has already passed means next year
+        if not match.group(3) and parsed < today.replace(day=1):
+            parsed = parsed.replace(year=year + 1)
+        return parsed.isoformat()
+
+    if any(word in text.lower() for word in IMMEDIATE_WORDS):
+        return today.isoformat()
+    return None
+
+
+def normalize_listing(listing):
+    """Add numeric rent, area, room count and availability date parsed from the display strings"""
+    listing['rent'] = parse_rent(listing.get('price'))
+    listing['area'] = parse_area(listing.get('size'))
+    listing['room_count'] = parse_room_count(listing.get('rooms'))
+    listing['available_date'] = parse_available_date(listing.get('available'))
+    return listing
@@ -0,0 +1,39 @@
+import os
+
+from bs4 import BeautifulSoup, SoupStrainer
+
+# 'auto' uses lxml when it is installed and falls back to Python's html.parser
+PARSER_BACKEND = os.environ.get('PARSER_BACKEND', 'auto')
+
+
+def _resolve_backend(backend):
+    if backend != 'auto':
+        return backend
+    try:
+        import lxml  # noqa: F401
+        return 'lxml'
+    except ImportError:
+        return 'html.parser'
+
+
+HTML_PARSER = _resolve_backend(PARSER_BACKEND)
+
+
+def make_soup(markup, parse_only=None, parser=None):
+    """
+    Parse markup with the configured backend. parse_only (a SoupStrainer) limits
+    tree building to the matching elements and their subtrees.
+    """
+    return BeautifulSoup(markup, parser or HTML_PARSER, parse_only=parse_only)
+
+
+def only_elements(name, class_):
+    """SoupStrainer that only keeps <name class="... class_ ..."> subtrees"""
+    def has_class(value):
+        # Depending on the bs4 version the class attribute is a string or a list here
+        if not value:
+            return False
+        classes = value.split() if isinstance(value, str) else value
+        return class_ in classes
+
+    return SoupStrainer(name, attrs={'class': has_class})
@@ -0,0 +1,109 @@
+import glob
+import json
+import os
+from functools import lru_cache
+from importlib import import_module
+from typing import Dict, List, Optional, Union
+from urllib.parse import urlparse
+
+from .base import RentalScraper
+
+# CLI name -> 'module:class' of the scrapers written in code. A scraper's module is only
+# imported when it is selected, so running one scraper doesn't load the others' dependencies.
+BUILTIN_SCRAPERS = {
+    'subo': 'scrapers.subo:SuboScraper',
+    'dios': 'scrapers.dios:DiosScraper',
+}
+# Installed packages can add scrapers under this entry point group, as name = 'module:Class'
+ENTRY_POINT_GROUP = 'rental_notifier.scrapers'
+# Declarative site definitions, one JSON file per site (see README)
+SITES_DIR = os.environ.get('SITES_DIR', 'sites')
+SITE_REQUIRED_KEYS = ('url', 'items', 'fields')
+
+# One instance per scraper, keeping its HTTP session and caches between daemon cycles
+_instances: Dict[str, RentalScraper] = {}
+
+
+def load_site_definitions(directory: str = SITES_DIR) -> Dict[str, Dict]:
+    """Site definitions by name (the file name unless the definition sets one)"""
+    sites = {}
+    for path in sorted(glob.glob(os.path.join(directory, '*.json'))):
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                definition = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"Skipping site definition {path}: {e}")
+            continue
+        missing = [key for key in SITE_REQUIRED_KEYS if key not in definition]
+        if missing or 'url' not in definition.get('fields', {}):
+            print(f"Skipping site definition {path}: missing {', '.join(missing) or 'fields.url'}")
+            continue
+        definition.setdefault('name', os.path.splitext(os.path.basename(path))[0])
+        sites[definition['name']] = definition
+    return sites
+
+
+def _entry_point_scrapers() -> Dict[str, str]:
+    # Imported here since importlib.metadata is slow to import (about 20ms)
+    from importlib.metadata import entry_points
+    try:
+        return {ep.name: ep.value for ep in entry_points(group=ENTRY_POINT_GROUP)}
+    except Exception as e:
+        print(f"Error reading scraper entry points: {e}")
+        return {}
+
+
+@lru_cache(maxsize=None)
+def discover() -> Dict[str, Union[str, Dict]]:
+    """
+    Every registered scraper by CLI name: built-in and entry point scrapers as
+    'module:Class', declarative sites as their definition. Nothing is imported yet.
+    """
+    scrapers = dict(BUILTIN_SCRAPERS)
+    for name, spec in list(_entry_point_scrapers().items()) + list(load_site_definitions().items()):
+        if name in scrapers:
+            print(f"Scraper {name} is already registered, skipping the duplicate")
+            continue
+        scrapers[name] = spec
+    return scrapers
+
+
+def scraper_names() -> List[str]:
+    return list(discover())
+
+
+def source_name(name: str) -> str:
+    """The source stored with the scraper's listings, without importing it"""
+    spec = discover()[name]
+    if isinstance(spec, dict):
+        return spec.get('source') or name
+    # Code scrapers are stored under their class name
+    return spec.split(':')[1]
+
+
+def get_scraper(name: str) -> RentalScraper:
+    """The scraper registered under name, imported and created on first use"""
+    if name not in _instances:
+        spec = discover()[name]
+        if isinstance(spec, dict):
+            from .declarative import DeclarativeScraper
+            _instances[name] = DeclarativeScraper(spec)
+        else:
+            module_name, class_name = spec.split(':')
+            _instances[name] = getattr(import_module(module_name), class_name)()
+    return _instances[name]
+
+
+def _domain(url: str) -> str:
+    return urlparse(url).netloc.lower().replace('www.', '')
+
+
+def company_for_domain(domain: str) -> Optional[str]:
+    """Company name declared by the site definition or scraper for a listing domain"""
+    for spec in discover().values():
+        if isinstance(spec, dict) and spec.get('company') and _domain(spec['url']) == domain:
+            return spec['company']
+    for scraper in _instances.values():
+        if scraper.company and _domain(getattr(scraper, 'url', '')) == domain:
+            return scraper.company
+    return None
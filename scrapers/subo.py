@@ -1,8 +1,10 @@
-import requests
-from bs4 import BeautifulSoup
-from datetime import datetime
 import re
-from .base import RentalScraper
+from .base import RentalScraper, SeenUrl, SourceUnchanged
+from .http_client import HttpClient
+from .metrics import metrics
+from .parsing import make_soup, only_elements
+
+IMAGE_URL_PATTERN = re.compile(r'background-image:\s*url\(["\'](.+?)["\']\)')
 
 class SuboScraper(RentalScraper):
     def __init__(self):
@@ -10,22 +12,17 @@ class SuboScraper(RentalScraper):
         self.headers = {
             'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
         }
+        self.http = HttpClient(headers=self.headers, scope=self.source)
 
-    def scrape(self, existing_listings):
-        try:
-            response = requests.get(self.url, headers=self.headers)
-            response.raise_for_status()
-            soup = BeautifulSoup(response.content, 'html.parser')
-            
-            current_urls = set()
-            newly_found = []
-            filtered_listings = []
-            reactivated = []
+    def parse_listings(self, html, parser=None):
+        """Extract raw listing fields from the listings page (parser overrides the configured backend)"""
+        # Only build the tree for the listing grid items, not the whole Elementor page
+        soup = make_soup(html, parse_only=only_elements('div', 'jet-listing-grid__item'), parser=parser)
+        results = []
 
-            # Extract listings from HTML
-            elementor_divs = soup.find_all('div', class_='elementor')
-            listing_containers = [item for item in elementor_divs 
-                                if item.get('data-elementor-type') == 'jet-listing-items']
+        for grid_item in soup.find_all('div', class_='jet-listing-grid__item'):
+            listing_containers = [item for item in grid_item.find_all('div', class_='elementor')
+                                  if item.get('data-elementor-type') == 'jet-listing-items']
 
             for item in listing_containers:
                 url_element = item.find('div', class_='make-column-clickable-elementor')
@@ -42,14 +39,12 @@ class SuboScraper(RentalScraper):
                     'image_url': None
                 }
 
-                # Extract image URL using existing methods
-                parent_item = item.find_parent('div', class_='jet-listing-grid__item')
-                if parent_item:
-                    style_tag = parent_item.find('style')
-                    if style_tag and style_tag.string:
-                        match = re.search(r'background-image:\s*url\(["\'](.+?)["\']\)', style_tag.string)
-                        if match:
-                            listing_data['image_url'] = match.group(1)
+                # Image URL is set as a background image in the grid item's <style> tag
+                style_tag = grid_item.find('style')
+                if style_tag and style_tag.string:
+                    match = IMAGE_URL_PATTERN.search(style_tag.string)
+                    if match:
+                        listing_data['image_url'] = match.group(1)
 
                 # Parse text fields
                 for h2 in h2_elements:
@@ -65,42 +60,24 @@ class SuboScraper(RentalScraper):
                     elif 'Ledigt' in text and not listing_data['available']:
                         listing_data['available'] = text
 
-                # Track current URLs instead of addresses
-                if listing_data['url']:
-                    current_urls.add(listing_data['url'])
+                results.append(listing_data)
 
-                # Create listing if we have all required fields
-                if all(v for k, v in listing_data.items() if k != 'price'):  # Price can be N/A
-                    listing = self.create_listing(**listing_data)
-                    
-                    # Check if listing already exists by URL
-                    existing = next((l for l in existing_listings if l['url'] == listing['url']), None)
-                    if existing:
-                        if not existing.get('active', True):
-                            continue
-                        
-                        # Preserve message_id and channel_id
-                        for key in ['message_id', 'channel_id']:
-                            if key in existing:
-                                listing[key] = existing[key]
-                                
-                        filtered_listings.append(listing)
-                    else:
-                        filtered_listings.append(listing)
-                        newly_found.append(listing)
+        return results
 
-            # Handle inactive listings using URL
-            removed_listings = []
-            for listing in existing_listings:
-                if listing['source'] == 'SuboScraper' and listing['url'] not in current_urls and listing.get('active', True):
-                    listing['active'] = False
-                    listing['removed_at'] = datetime.now().strftime('%Y-%m-%d')
-                    listing['last_updated'] = datetime.now().isoformat()
-                    removed_listings.append(listing)
-                    filtered_listings.append(listing)
+    def iter_listings(self, existing_listings):
+        response = self.http.get(self.url)
+        response.raise_for_status()
+        # Nothing changed since the last run, no need to parse and diff
+        if response.unchanged and self.has_stored_listings(existing_listings):
+            raise SourceUnchanged()
 
-            return filtered_listings, newly_found, removed_listings, reactivated
+        with metrics.span(self.source, 'parse'):
+            parsed = self.parse_listings(response.content)
 
-        except requests.exceptions.RequestException as e:
-            print(f"Error scraping SUBO: {e}")
-            return [], [], [], []
+        for listing_data in parsed:
+            # Create listing if we have all required fields
+            if all(v for k, v in listing_data.items() if k != 'price'):  # Price can be N/A
+                yield self.create_listing(**listing_data)
+            elif listing_data['url']:
+                # Still listed, so don't treat it as removed
+                yield SeenUrl(listing_data['url'])
@@ -0,0 +1,191 @@
+"""
+Cold-start benchmark of each command-line mode, measured with `python -X importtime`.
+
+    python startup_benchmark.py                    # compare against the baseline
+    python startup_benchmark.py --update-baseline  # store the current results as the new baseline
+
+Every mode runs in a fresh interpreter in an empty directory and offline: HTTP is
+replayed from an empty fixture directory (so each request fails at once) and the
+fake Discord backend is used. What is left is the cost of starting up, importing
+and loading state, which is what a cron run that finds nothing pays.
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+BASELINE_FILE = 'startup_baseline.json'
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+# Allowed growth over the baseline before a result counts as a regression
+TIME_TOLERANCE = 0.25
+# Packages that are slow to import; loading one in a mode that didn't before is a regression
+HEAVY_PACKAGES = ('discord', 'aiohttp', 'requests', 'bs4', 'lxml')
+
+MODES = {
+    'help': ['main.py', '--help'],
+    'archive-search': ['main.py', '--archive-search', 'storgatan'],
+    'clear': ['main.py', '--clear'],
+    'debug': ['main.py', '--debug'],
+    'subo': ['main.py', '--subo'],
+    'dios': ['main.py', '--dios'],
+    'all': ['main.py'],
+    # A cron run where no site is due yet
+    'adaptive-idle': ['main.py', '--adaptive'],
+    'purge-bot': ['-c', 'import purge_bot'],
+}
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Cold-start benchmark of the command-line modes')
+    parser.add_argument('--update-baseline', action='store_true', help=f'Write the results to {BASELINE_FILE}')
+    parser.add_argument('--runs', type=int, default=5, help='Number of timed runs per mode')
+    parser.add_argument('--modes', nargs='+', choices=list(MODES), default=list(MODES), help='Modes to measure')
+    parser.add_argument('--baseline', default=BASELINE_FILE, help='Baseline file')
+    parser.add_argument('--top', type=int, default=0, help='Also print the N slowest imports of each mode')
+    return parser.parse_args()
+
+
+def parse_importtime(stderr):
+    """
+    (total import seconds, {top-level package: cumulative seconds}, set of all packages
+    imported) from -X importtime output
+    """
+    packages = {}
+    imported = set()
+    total = 0
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        package = name.strip().split('.')[0]
+        imported.add(package)
+        # Nested imports are indented under the module that imported them
+        if name.startswith('   '):
+            continue
+        seconds = int(cumulative) / 1e6
+        total += seconds
+        packages[package] = packages.get(package, 0) + seconds
+    return total, packages, imported
+
+
+def prepare(workdir, mode):
+    # Each mode starts from the same empty state, except that adaptive-idle has just run every site
+    for name in os.listdir(workdir):
+        if name.endswith(('.json', '.jsonl', '.db')):
+            os.remove(os.path.join(workdir, name))
+    if mode == 'adaptive-idle':
+        sys.path.insert(0, REPO_DIR)
+        from scrapers.registry import scraper_names, source_name
+        now = datetime.now().isoformat()
+        state = {source_name(name): {'last_run': now, 'idle_runs': 0} for name in scraper_names()}
+        with open(os.path.join(workdir, 'schedule.json'), 'w', encoding='utf-8') as f:
+            json.dump(state, f)
+
+
+def run_mode(mode, workdir):
+    """One cold start of the mode. Returns (wall seconds, import seconds, {package: seconds}, packages imported)."""
+    prepare(workdir, mode)
+    args = MODES[mode]
+    if args[0] == 'main.py':
+        args = [os.path.join(REPO_DIR, 'main.py')] + args[1:]
+    env = dict(os.environ,
+               PYTHONPATH=os.pathsep.join(filter(None, [REPO_DIR, os.environ.get('PYTHONPATH')])),
+               NOTIFIER_BACKEND='fake',
+               DISCORD_BOT_TOKEN='startup-benchmark',
+               DISCORD_CHANNEL_ID='1',
+               HTTP_FIXTURES_MODE='replay',
+               HTTP_FIXTURES_DIR=os.path.join(workdir, 'fixtures'),
+               HTTP_RETRIES='0',
+               ARCHIVE_DIR=os.path.join(workdir, 'archive'))
+    started = time.perf_counter()
+    result = subprocess.run([sys.executable, '-X', 'importtime'] + args, cwd=workdir, env=env,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+    wall_time = time.perf_counter() - started
+    if result.returncode != 0:
+        errors = [line for line in result.stderr.splitlines() if not line.startswith('import time:')]
+        raise RuntimeError(f"{mode} exited with {result.returncode}: {' '.join(errors[-3:])}")
+    import_time, packages, imported = parse_importtime(result.stderr)
+    return wall_time, import_time, packages, imported
+
+
+def benchmark(modes, runs):
+    results = {}
+    with tempfile.TemporaryDirectory() as workdir:
+        for mode in modes:
+            # The first run warms the bytecode and OS file caches and isn't counted
+            run_mode(mode, workdir)
+            timed = [run_mode(mode, workdir) for _ in range(runs)]
+            _, _, packages, imported = timed[-1]
+            results[mode] = {
+                'wall_time': round(statistics.median(t[0] for t in timed), 4),
+                'import_time': round(statistics.median(t[1] for t in timed), 4),
+                'heavy_packages': sorted(p for p in HEAVY_PACKAGES if p in imported),
+                'slowest_imports': {p: round(s, 4) for p, s in sorted(packages.items(), key=lambda item: -item[1])[:10]},
+            }
+    return results
+
+
+def compare(results, baseline):
+    """Regressions of the results against the baseline, as printable strings"""
+    regressions = []
+    for mode, result in results.items():
+        base = baseline.get('modes', {}).get(mode)
+        if not base:
+            regressions.append(f"{mode}: not in the baseline")
+            continue
+        if result['wall_time'] > base['wall_time'] * (1 + TIME_TOLERANCE):
+            regressions.append(f"{mode}: wall time {result['wall_time']:.3f}s vs {base['wall_time']:.3f}s")
+        if result['import_time'] > base['import_time'] * (1 + TIME_TOLERANCE):
+            regressions.append(f"{mode}: import time {result['import_time']:.3f}s vs {base['import_time']:.3f}s")
+        added = set(result['heavy_packages']) - set(base['heavy_packages'])
+        if added:
+            regressions.append(f"{mode}: now imports {', '.join(sorted(added))}")
+    return regressions
+
+
+def print_results(results, baseline, top=0):
+    for mode, result in results.items():
+        base = baseline.get('modes', {}).get(mode, {})
+        vs = f" (baseline {base['wall_time']:.3f}s)" if base else ''
+        print(f"{mode}: {result['wall_time']:.3f}s{vs}, imports {result['import_time']:.3f}s, "
+              f"heavy: {', '.join(result['heavy_packages']) or 'none'}")
+        for package, seconds in list(result['slowest_imports'].items())[:top]:
+            print(f"    {package}: {seconds * 1000:.1f}ms")
+
+
+if __name__ == "__main__":
+    args = parse_args()
+
+    try:
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+    except (OSError, json.JSONDecodeError) as e:
+        if not args.update_baseline:
+            # Without a baseline nothing would be compared and every run would pass
+            print(f"Can't read the baseline {args.baseline} ({e}), run with --update-baseline first")
+            sys.exit(1)
+        baseline = {}
+
+    results = benchmark(args.modes, args.runs)
+    print_results(results, baseline, args.top)
+
+    if args.update_baseline:
+        with open(args.baseline, 'w', encoding='utf-8') as f:
+            json.dump({
+                'python': platform.python_version(),
+                'runs': args.runs,
+                'modes': results,
+            }, f, indent=2)
+        print(f"Baseline written to {args.baseline}")
+        sys.exit(0)
+
+    regressions = compare(results, baseline)
+    for regression in regressions:
+        print(f"Regression: {regression}")
+    sys.exit(1 if regressions else 0)
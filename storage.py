@@ -0,0 +1,275 @@
+import json
+import os
+import sqlite3
+from collections import OrderedDict
+from datetime import datetime
+from typing import Dict, List
+
+from scrapers.listing import Listing, to_json_value
+
+JOURNAL_COMPACT_EVENTS = int(os.environ.get('JOURNAL_COMPACT_EVENTS', 200))
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS listings (
+    url TEXT PRIMARY KEY,
+    source TEXT,
+    active INTEGER NOT NULL DEFAULT 1,
+    message_id INTEGER,
+    channel_id INTEGER,
+    removed_at TEXT,
+    first_seen TEXT NOT NULL,
+    updated_at TEXT NOT NULL,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_listings_source_active ON listings (source, active);
+CREATE INDEX IF NOT EXISTS idx_listings_message_id ON listings (message_id);
+"""
+
+
+def _serialize(listing: Dict) -> str:
+    return json.dumps(listing, ensure_ascii=False, default=to_json_value)
+
+
+def _fsync_dir(path: str):
+    # Make a rename durable (not supported on every platform)
+    try:
+        fd = os.open(os.path.dirname(os.path.abspath(path)), os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+def atomic_write_json(path: str, data, indent=2):
+    """Write JSON to a temp file, fsync it and rename it over path"""
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(data, f, indent=indent, ensure_ascii=False, default=to_json_value)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+    _fsync_dir(path)
+
+
+def read_json_listings(path: str) -> List[Dict]:
+    with open(path, "r", encoding="utf-8") as f:
+        file_content = f.read()
+    return [Listing.from_dict(data) for data in json.loads(file_content)] if file_content else []
+
+
+class SqliteListingStore:
+    """Listings stored in an indexed SQLite table, written incrementally"""
+
+    def __init__(self, path: str, json_path: str = None):
+        self.path = path
+        # listings.json is migrated from on first run and exported to after every save
+        self.json_path = json_path
+        self.conn = sqlite3.connect(path)
+        self.conn.executescript(SCHEMA)
+        # Serialized rows as last loaded/saved, used to only write rows that changed
+        self._saved = {}
+
+    def is_empty(self) -> bool:
+        return self.conn.execute("SELECT 1 FROM listings LIMIT 1").fetchone() is None
+
+    def load(self) -> List[Dict]:
+        if self.json_path:
+            self.migrate_from_json(self.json_path)
+        listings = []
+        self._saved = {}
+        for url, data in self.conn.execute("SELECT url, data FROM listings ORDER BY rowid"):
+            listings.append(Listing.from_dict(json.loads(data)))
+            self._saved[url] = data
+        return listings
+
+    def save(self, listings: List[Dict]) -> int:
+        """
+        Make the table match listings, upserting only rows that changed and
+        deleting rows that are no longer present. Returns the number of rows written.
+        """
+        now = datetime.now().isoformat()
+        rows = {}
+        for listing in listings:
+            if listing.get('url'):
+                rows[listing['url']] = (listing, _serialize(listing))
+
+        changed = [(listing, data) for url, (listing, data) in rows.items() if self._saved.get(url) != data]
+        deleted = [url for url in self._saved if url not in rows]
+
+        # One transaction, so a crash leaves either the old or the new state
+        with self.conn:
+            self.conn.executemany(
+                """
+                INSERT INTO listings (url, source, active, message_id, channel_id, removed_at, first_seen, updated_at, data)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT(url) DO UPDATE SET
+                    source = excluded.source,
+                    active = excluded.active,
+                    message_id = excluded.message_id,
+                    channel_id = excluded.channel_id,
+                    removed_at = excluded.removed_at,
+                    updated_at = excluded.updated_at,
+                    data = excluded.data
+                """,
+                [(
+                    listing['url'],
+                    listing.get('source'),
+                    1 if listing.get('active', True) else 0,
+                    listing.get('message_id'),
+                    listing.get('channel_id'),
+                    listing.get('removed_at'),
+                    now,
+                    now,
+                    data
+                ) for listing, data in changed]
+            )
+            self.conn.executemany("DELETE FROM listings WHERE url = ?", [(url,) for url in deleted])
+
+        self._saved = {url: data for url, (listing, data) in rows.items()}
+        if self.json_path:
+            self.export_json(self.json_path, listings)
+        return len(changed) + len(deleted)
+
+    def migrate_from_json(self, json_path: str) -> int:
+        """One-shot import of an existing listings.json into an empty database"""
+        if not os.path.exists(json_path) or not self.is_empty():
+            return 0
+        try:
+            listings = read_json_listings(json_path)
+        except (OSError, json.JSONDecodeError) as e:
+            print(f"Error reading {json_path} for migration: {e}")
+            return 0
+        self._saved = {}
+        # Don't export back over the file being migrated
+        json_path, self.json_path = self.json_path, None
+        try:
+            self.save(listings)
+        finally:
+            self.json_path = json_path
+        print(f"Migrated {len(listings)} listings from {json_path} to {self.path}")
+        return len(listings)
+
+    def export_json(self, json_path: str, listings: List[Dict]):
+        """Write listings to JSON for the GitHub Actions artifact"""
+        atomic_write_json(json_path, listings)
+
+    def close(self):
+        self.conn.close()
+
+
+class JournalListingStore:
+    """
+    Listings stored as a JSON snapshot plus an append-only, line-delimited journal
+    of changes. Each save appends only the changed listings; the journal is
+    periodically compacted into a new snapshot.
+    """
+
+    def __init__(self, snapshot_path: str, journal_path: str = None, compact_events: int = JOURNAL_COMPACT_EVENTS):
+        self.snapshot_path = snapshot_path
+        self.journal_path = journal_path or f"{os.path.splitext(snapshot_path)[0]}.journal.jsonl"
+        self.compact_events = compact_events
+        self._saved = {}
+        self._journal_events = 0
+
+    def load(self) -> List[Dict]:
+        listings = OrderedDict()
+        if os.path.exists(self.snapshot_path):
+            try:
+                for listing in read_json_listings(self.snapshot_path):
+                    if listing.get('url'):
+                        listings[listing['url']] = listing
+            except json.JSONDecodeError:
+                print(f"Error decoding JSON from {self.snapshot_path}. Starting from the journal only.")
+
+        # Replay only the changes made since the last snapshot
+        self._journal_events = 0
+        if os.path.exists(self.journal_path):
+            valid_bytes = 0
+            with open(self.journal_path, "rb") as f:
+                for line in f:
+                    try:
+                        event = json.loads(line)
+                    except ValueError:
+                        # A crash mid-append can leave a partial last line
+                        print(f"Dropping corrupt tail of {self.journal_path}")
+                        break
+                    if event['event'] == 'deleted':
+                        listings.pop(event['url'], None)
+                    else:
+                        listings[event['url']] = Listing.from_dict(event['listing'])
+                    self._journal_events += 1
+                    valid_bytes += len(line)
+            # Cut off the partial line so new events start on a clean line
+            if valid_bytes < os.path.getsize(self.journal_path):
+                with open(self.journal_path, "r+b") as f:
+                    f.truncate(valid_bytes)
+
+        self._saved = {url: _serialize(listing) for url, listing in listings.items()}
+        return list(listings.values())
+
+    def _event_type(self, url: str, listing: Dict) -> str:
+        previous = self._saved.get(url)
+        if previous is None:
+            return 'new'
+        was_active = json.loads(previous).get('active', True)
+        is_active = listing.get('active', True)
+        if was_active and not is_active:
+            return 'removed'
+        if is_active and not was_active:
+            return 'reactivated'
+        return 'updated'
+
+    def save(self, listings: List[Dict]) -> int:
+        """Append an event for every listing that changed. Returns the number of events written."""
+        now = datetime.now().isoformat()
+        rows = {}
+        for listing in listings:
+            if listing.get('url'):
+                rows[listing['url']] = (listing, _serialize(listing))
+
+        events = []
+        for url, (listing, data) in rows.items():
+            if self._saved.get(url) != data:
+                events.append({'ts': now, 'event': self._event_type(url, listing), 'url': url, 'listing': listing})
+        for url in self._saved:
+            if url not in rows:
+                events.append({'ts': now, 'event': 'deleted', 'url': url})
+
+        if events:
+            with open(self.journal_path, "a", encoding="utf-8") as f:
+                f.write(''.join(json.dumps(event, ensure_ascii=False, default=to_json_value) + '\n' for event in events))
+                f.flush()
+                os.fsync(f.fileno())
+            self._journal_events += len(events)
+
+        self._saved = {url: data for url, (listing, data) in rows.items()}
+        if self._journal_events >= self.compact_events:
+            self.compact(listings)
+        return len(events)
+
+    def compact(self, listings: List[Dict]):
+        """Write a new snapshot atomically, then start an empty journal"""
+        atomic_write_json(self.snapshot_path, listings)
+        # If we crash before truncating, replaying the old journal over the
+        # new snapshot gives the same result, since events hold full listings
+        with open(self.journal_path, "w", encoding="utf-8") as f:
+            f.flush()
+            os.fsync(f.fileno())
+        print(f"Compacted {self._journal_events} journal events into {self.snapshot_path}")
+        self._journal_events = 0
+
+    def close(self):
+        pass
+
+
+def open_store(backend: str, json_path: str, db_path: str):
+    """Create the listing store selected by LISTINGS_BACKEND"""
+    if backend == 'journal':
+        return JournalListingStore(json_path)
+    if backend == 'sqlite':
+        return SqliteListingStore(db_path, json_path=json_path)
+    raise ValueError(f"Unknown listings backend: {backend}")
@@ -0,0 +1,170 @@
+import json
+import os
+from bisect import bisect_left
+from typing import Dict, List
+
+# Subscription filter keys and the normalized listing field each one bounds
+RANGE_FILTERS = {
+    'rent': ('min_rent', 'max_rent'),
+    'area': ('min_area', 'max_area'),
+    'room_count': ('min_rooms', 'max_rooms'),
+}
+
+
+def load_subscriptions(path: str) -> List[Dict]:
+    """
+    Read subscriptions from a JSON list. Each subscription has an id, one target
+    (channel_id, user_id for a DM, or webhook_url) and any of the filters
+    min_rent/max_rent, min_area/max_area, min_rooms/max_rooms, sources and keywords.
+    """
+    if not os.path.exists(path):
+        return []
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, json.JSONDecodeError) as e:
+        print(f"Error reading subscriptions from {path}: {e}")
+        return []
+
+
+def source_key(source: str) -> str:
+    # 'SuboScraper' and 'subo' both mean the same source
+    source = (source or '').lower()
+    return source[:-len('scraper')] if source.endswith('scraper') else source
+
+
+def _bits(mask: int):
+    while mask:
+        low = mask & -mask
+        yield low.bit_length() - 1
+        mask ^= low
+
+
+class RangeIndex:
+    """
+    Subscriptions whose [min, max] range contains a value. The endpoints of all
+    ranges split the number line into slots (each endpoint and each gap between
+    endpoints), and every slot stores a bitmask of the subscriptions covering it,
+    so a lookup is one bisect.
+    """
+
+    def __init__(self, ranges):
+        # ranges: (bit, low, high) with None for an open end
+        self.unbounded = 0
+        bounded = []
+        for bit, low, high in ranges:
+            if low is None and high is None:
+                self.unbounded |= 1 << bit
+            else:
+                bounded.append((bit, low, high))
+
+        self.points = sorted({value for _, low, high in bounded for value in (low, high) if value is not None})
+        position = {value: i for i, value in enumerate(self.points)}
+        # Slot 2i is the gap before points[i], slot 2i+1 is points[i] itself
+        slot_count = 2 * len(self.points) + 1
+        starts = [0] * (slot_count + 1)
+        ends = [0] * (slot_count + 1)
+        for bit, low, high in bounded:
+            first = 0 if low is None else 2 * position[low] + 1
+            last = slot_count - 1 if high is None else 2 * position[high] + 1
+            if first > last:
+                continue
+            starts[first] |= 1 << bit
+            ends[last + 1] |= 1 << bit
+
+        # Sweep the slots once, adding ranges where they start and dropping them after they end
+        self.slots = []
+        mask = 0
+        for slot in range(slot_count):
+            mask = (mask & ~ends[slot]) | starts[slot]
+            self.slots.append(mask)
+
+    def match(self, value) -> int:
+        if value is None:
+            # Listings without a value only match subscriptions that don't filter on it
+            return self.unbounded
+        i = bisect_left(self.points, value)
+        slot = 2 * i + 1 if i < len(self.points) and self.points[i] == value else 2 * i
+        return self.slots[slot] | self.unbounded
+
+
+class _TrieNode:
+    __slots__ = ('children', 'mask')
+
+    def __init__(self):
+        self.children = {}
+        self.mask = 0
+
+
+class KeywordTrie:
+    """
+    Subscriptions whose keywords appear in an address. Keywords are matched at the
+    start of a word, so 'haga' matches 'Hagagatan 4' but not 'Stenhaga'.
+    """
+
+    def __init__(self, keywords):
+        # keywords: (bit, [keyword, ...]); an empty list matches every address
+        self.root = _TrieNode()
+        self.unfiltered = 0
+        for bit, words in keywords:
+            words = [word.lower().strip() for word in words or () if word and word.strip()]
+            if not words:
+                self.unfiltered |= 1 << bit
+                continue
+            for word in words:
+                node = self.root
+                for char in word:
+                    node = node.children.setdefault(char, _TrieNode())
+                node.mask |= 1 << bit
+
+    def match(self, text) -> int:
+        mask = self.unfiltered
+        text = (text or '').lower()
+        for start in range(len(text)):
+            if start and text[start - 1].isalnum():
+                continue
+            node = self.root
+            for char in text[start:]:
+                node = node.children.get(char)
+                if node is None:
+                    break
+                mask |= node.mask
+        return mask
+
+
+class SubscriptionIndex:
+    """
+    Subscriptions compiled into per-filter indexes. Each index returns a bitmask
+    of matching subscriptions and a listing matches the subscriptions set in all
+    of them, so matching doesn't loop over every subscription.
+    """
+
+    def __init__(self, subscriptions: List[Dict]):
+        self.subscriptions = list(subscriptions)
+        self.ranges = {
+            field: RangeIndex((bit, sub.get(low), sub.get(high)) for bit, sub in enumerate(self.subscriptions))
+            for field, (low, high) in RANGE_FILTERS.items()
+        }
+        self.keywords = KeywordTrie((bit, sub.get('keywords')) for bit, sub in enumerate(self.subscriptions))
+
+        self.any_source = 0
+        self.by_source = {}
+        for bit, sub in enumerate(self.subscriptions):
+            if not sub.get('sources'):
+                self.any_source |= 1 << bit
+            for source in sub.get('sources') or ():
+                self.by_source[source_key(source)] = self.by_source.get(source_key(source), 0) | 1 << bit
+
+    def __len__(self):
+        return len(self.subscriptions)
+
+    def match(self, listing: Dict) -> List[Dict]:
+        """Subscriptions whose filters all match the listing's normalized fields"""
+        mask = self.any_source | self.by_source.get(source_key(listing.get('source')), 0)
+        for field, index in self.ranges.items():
+            if not mask:
+                return []
+            mask &= index.match(listing.get(field))
+        if mask:
+            mask &= self.keywords.match(listing.get('address'))
+        return [self.subscriptions[bit] for bit in _bits(mask)]
@@ -0,0 +1,105 @@
+import asyncio
+import contextlib
+import io
+import unittest
+
+import main
+from fake_discord import FakeNotifier
+from scrapers.base import RentalScraper
+from scrapers.dedup import DuplicateIndex
+from scrapers.normalize import normalize_listing
+
+OLD_URL = 'https://example.se/lagenhet/storgatan-12-old/'
+NEW_URL = 'https://example.se/lagenhet/storgatan-12-new/'
+
+
+def stored_listing(url, source='stub', active=True):
+    # A listing notified on an earlier run, as loaded from storage
+    listing = normalize_listing({
+        'address': 'Storgatan 12, Sundsvall', 'url': url, 'price': '7500:-/månad', 'size': '52 kvm',
+        'rooms': '2 rum', 'available': 'Ledigt från 2024-06-01', 'image_url': 'https://example.se/1.jpg',
+        'active': active, 'source': source, 'first_seen': '2024-05-01T10:00:00',
+        'message_id': 1234567890123456789, 'channel_id': 1, 'embed_index': 0, 'embed_count': 1,
+        'notified_at': '2024-05-01T10:00:00',
+    })
+    if not active:
+        listing['removed_at'] = '2099-01-01T00:00:00'
+    return listing
+
+
+class StubScraper(RentalScraper):
+    """Lists the same flat as stored_listing() under a new URL"""
+
+    def __init__(self, urls):
+        self.urls = urls
+
+    @property
+    def source(self):
+        return 'stub'
+
+    def iter_listings(self, existing_listings):
+        for url in self.urls:
+            yield self.create_listing(address='Storgatan 12, Sundsvall', url=url, price='7500:-/månad',
+                                      size='52 kvm', rooms='2 rum', available='Ledigt från 2024-06-01',
+                                      image_url='https://example.se/1.jpg')
+
+
+def scrape(existing_listings, urls):
+    notifier = FakeNotifier(log_path=None)
+    with contextlib.redirect_stdout(io.StringIO()):
+        result = asyncio.run(main.scrape_and_notify(notifier, existing_listings, [StubScraper(urls)]))
+    return result, notifier.channel.log
+
+
+class SameSourceUrlChangeTest(unittest.TestCase):
+    def test_moved_listing_is_merged_into_the_old_message(self):
+        old = stored_listing(OLD_URL)
+        (all_listings, new, removed, _), log = scrape([old], [NEW_URL])
+
+        self.assertEqual([listing['url'] for listing in removed], [OLD_URL])
+        moved = next(listing for listing in all_listings if listing['url'] == NEW_URL)
+        self.assertEqual(moved['duplicate_of'], OLD_URL)
+        self.assertEqual(moved['message_id'], old['message_id'])
+        # The old message is edited once to show the listing under its new URL, nothing is re-posted
+        self.assertEqual([entry['action'] for entry in log], ['edit'])
+
+    def test_similar_listing_on_the_same_site_is_sent(self):
+        old = stored_listing(OLD_URL)
+        (all_listings, _, removed, _), log = scrape([old], [OLD_URL, NEW_URL])
+
+        self.assertEqual(removed, [])
+        listing = next(listing for listing in all_listings if listing['url'] == NEW_URL)
+        self.assertNotIn('duplicate_of', listing)
+        self.assertEqual([entry['action'] for entry in log], ['send'])
+
+
+class DuplicateIndexTest(unittest.TestCase):
+    def test_same_source_match_is_held_back(self):
+        index = DuplicateIndex([stored_listing(OLD_URL)])
+        new = stored_listing(NEW_URL)
+        self.assertEqual(index.split([new]), ([], []))
+        self.assertEqual(index.pending, [new])
+
+    def test_pending_listing_resolves_against_removed(self):
+        old = stored_listing(OLD_URL)
+        index = DuplicateIndex([old])
+        new = stored_listing(NEW_URL)
+        index.split([new])
+        self.assertEqual(index.resolve_pending([old]), ([], [(new, old)]))
+        self.assertEqual(index.pending, [])
+
+        index.split([stored_listing(NEW_URL + '2')])
+        fresh, duplicates = index.resolve_pending([])
+        self.assertEqual([listing['url'] for listing in fresh], [NEW_URL + '2'])
+        self.assertEqual(duplicates, [])
+
+    def test_removed_same_source_listing_matches_immediately(self):
+        old = stored_listing(OLD_URL, active=False)
+        index = DuplicateIndex([old])
+        new = stored_listing(NEW_URL)
+        self.assertEqual(index.split([new]), ([], [(new, old)]))
+        self.assertEqual(index.pending, [])
+
+
+if __name__ == '__main__':
+    unittest.main()
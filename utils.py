@@ -1,10 +1,13 @@
 from datetime import datetime
 from urllib.parse import urlparse
 
+# Discord allows at most 10 embeds per message
+MAX_EMBEDS_PER_MESSAGE = 10
+
 COMPANY_MAPPINGS = {
     'subo.se': 'Sundsvalls Bostäder',
     'dios.se': 'Diös Fastigheter',
-    # Add more companies here as needed
+    # Sites defined in sites/*.json set their company in the definition instead
 }
 
 def get_company_name(url: str) -> str:
@@ -12,12 +15,15 @@ def get_company_name(url: str) -> str:
     try:
         domain = urlparse(url).netloc.lower()
         domain = domain.replace('www.', '')
-        return COMPANY_MAPPINGS.get(domain, 'Unknown Company')
+        if domain in COMPANY_MAPPINGS:
+            return COMPANY_MAPPINGS[domain]
+        from scrapers.registry import company_for_domain
+        return company_for_domain(domain) or 'Unknown Company'
     except:
         return 'Unknown Company'
 
-def format_notification_title(url: str) -> str:
-    """Format the notification title with date and company name."""
+def format_notification_title(url: str, date: str = None) -> str:
+    """Format the notification title with date (default today) and company name."""
     company = get_company_name(url)
-    date = datetime.now().strftime('%Y-%m-%d')
+    date = date or datetime.now().strftime('%Y-%m-%d')
     return f"🏠 {company} [{date}]"